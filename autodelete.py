@@ -0,0 +1,114 @@
+import os
+import time
+import logging
+from collections import defaultdict
+
+from pymongo import ASCENDING
+from telegram import Message
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+from telegram.ext import Application, ContextTypes
+
+logger = logging.getLogger(__name__)
+
+# ──────────────────── CONFIG ────────────────────
+DELETE_BUCKET_SECONDS = int(os.getenv("DELETE_BUCKET_SECONDS", 5))
+DELETE_BATCH_SIZE     = 100   # Bot API limit for deleteMessages
+DELETE_RETRY_SECONDS  = 30    # back-off after a timeout or network error
+
+
+class DeletionQueue:
+    """Time-bucketed queue of bot messages to delete, persisted to Mongo.
+
+    Pending deletions live in a timing wheel of ``bucket_seconds`` slots,
+    mirrored as ``(bot_id, chat_id, message_id, due)`` documents so they
+    survive a restart. A single repeating job drains every due slot and
+    removes each chat's messages with one ``deleteMessages`` call per 100 ids,
+    instead of one JobQueue job and one API call per message.
+    """
+
+    def __init__(self, bucket_seconds: int = DELETE_BUCKET_SECONDS):
+        self.bucket_seconds = bucket_seconds
+        self.coll = None
+        self.bot_id: int | None = None
+        self._wheel: dict[int, dict[int, list[int]]] = defaultdict(lambda: defaultdict(list))
+        self.scheduled = self.deleted = self.failed = 0
+
+    def __len__(self) -> int:
+        return sum(len(ids) for chats in self._wheel.values() for ids in chats.values())
+
+    def _slot(self, due: float) -> int:
+        return int(due // self.bucket_seconds)
+
+    async def attach(self, app: Application, coll=None):
+        """Bind storage, reload deletions left by a previous run and start draining"""
+        self.bot_id = app.bot.id
+        if coll is not None:
+            self.coll = coll
+            try:
+                await coll.create_index([("bot_id", ASCENDING), ("due", ASCENDING)], name="bot_due")
+                restored = 0
+                async for doc in coll.find({"bot_id": self.bot_id}, {"_id": 0, "chat_id": 1, "message_id": 1, "due": 1}):
+                    self._wheel[self._slot(doc["due"])][doc["chat_id"]].append(doc["message_id"])
+                    restored += 1
+                if restored:
+                    logger.info(f"Restored {restored} pending deletion(s)")
+            except Exception as e:
+                logger.error(f"Could not restore pending deletions: {e}")
+        app.job_queue.run_repeating(self.job, interval=self.bucket_seconds, first=self.bucket_seconds)
+
+    async def schedule(self, msg: Message | None, delay: float):
+        if not msg: return
+        due = time.time() + delay
+        self._wheel[self._slot(due)][msg.chat_id].append(msg.message_id)
+        self.scheduled += 1
+        if self.coll is None: return
+        try:
+            await self.coll.insert_one(
+                {"bot_id": self.bot_id, "chat_id": msg.chat_id, "message_id": msg.message_id, "due": due}
+            )
+        except Exception as e:
+            logger.error(f"Could not persist deletion for {msg.chat_id}/{msg.message_id}: {e}")
+
+    def _take_due(self) -> dict[int, list[int]]:
+        now = self._slot(time.time())
+        due: dict[int, list[int]] = defaultdict(list)
+        for slot in [s for s in self._wheel if s <= now]:
+            for chat_id, ids in self._wheel.pop(slot).items():
+                due[chat_id].extend(ids)
+        return due
+
+    async def job(self, context: ContextTypes.DEFAULT_TYPE):
+        for chat_id, ids in self._take_due().items():
+            for i in range(0, len(ids), DELETE_BATCH_SIZE):
+                batch = ids[i:i + DELETE_BATCH_SIZE]
+                try:
+                    await context.bot.delete_messages(chat_id, batch)
+                    self.deleted += len(batch)
+                except RetryAfter as e:
+                    # Put the rest of this chat back and try again once allowed
+                    self._requeue(chat_id, ids[i:], float(e.retry_after))
+                    logger.warning(f"Deletes in {chat_id} rate limited, retrying in {e.retry_after}s")
+                    break
+                except (BadRequest, Forbidden) as e:
+                    # Too old, already deleted or no longer in the chat; nothing to retry
+                    self.failed += len(batch)
+                    logger.warning(f"Failed to delete {len(batch)} message(s) in {chat_id}: {e}")
+                except NetworkError as e:
+                    # Timeouts and connection errors are transient; the Mongo copy stays
+                    self._requeue(chat_id, ids[i:], DELETE_RETRY_SECONDS)
+                    logger.warning(f"Deletes in {chat_id} failed ({e}), retrying in {DELETE_RETRY_SECONDS}s")
+                    break
+                except Exception as e:
+                    self.failed += len(batch)
+                    logger.error(f"Failed to delete {len(batch)} message(s) in {chat_id}: {e}")
+                await self._forget(chat_id, batch)
+
+    def _requeue(self, chat_id: int, ids: list[int], delay: float):
+        self._wheel[self._slot(time.time() + delay)][chat_id].extend(ids)
+
+    async def _forget(self, chat_id: int, ids: list[int]):
+        if self.coll is None: return
+        try:
+            await self.coll.delete_many({"bot_id": self.bot_id, "chat_id": chat_id, "message_id": {"$in": ids}})
+        except Exception as e:
+            logger.error(f"Could not clear persisted deletions for {chat_id}: {e}")
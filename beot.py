@@ -1,14 +1,17 @@
 import os
-import random
+import asyncio
 import requests
 import google.generativeai as genai
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
 from datetime import datetime
-from PIL import Image, ImageDraw, ImageFont
-import io
-from bs4 import BeautifulSoup
-import difflib
+from bs4 import BeautifulSoup, SoupStrainer
+from motor.motor_asyncio import AsyncIOMotorClient
+from autodelete import DeletionQueue
+from llm import LLMClient, stream_reply
+from welcome import WelcomeRenderer, JoinAggregator, burst_caption
+from funfacts import FunFactsCache
+from titleindex import TitleIndex, INDEX_MATCH_SCORE, normalize_title
 
 # Environment variables
 BOT_TOKEN = os.getenv("BOT_TOKEN")
@@ -30,45 +33,118 @@ model = genai.GenerativeModel("gemini-1.5-flash")
 # Global variable for suggestion cycling
 suggestion_index = 0
 
+# Async Gemini client: bounded concurrency, deadlines and backpressure
+llm = LLMClient(model)
+
 # Function to generate AI content
-def generate_ai_content(prompt: str) -> str:
-    try:
-        response = model.generate_content(prompt)
-        return response.text if response else "No response generated."
-    except Exception as e:
-        print(f"Error generating AI response: {e}")
-        return "Error generating AI response."
+async def generate_ai_content(prompt: str) -> str:
+    return await llm.generate(prompt)
 
-# Function to get trending Bollywood movies from IMDb
-def get_trending_bollywood_movies():
-    """Scrape IMDb trending page for Bollywood movies"""
-    url = "https://www.imdb.com/india/trending/"
+# Fun facts per imdbID, in Mongo when MONGO_URI is set, else on disk
+fun_facts_cache = FunFactsCache(generate_ai_content)
+
+# Trending Bollywood movies from IMDb, scraped in the background and served from memory
+TRENDING_URL = "https://www.imdb.com/india/trending/"
+TRENDING_REFRESH_SECONDS = 30 * 60
+FALLBACK_TRENDING = ["Coolie", "War 2", "Kingdom", "Mahavatar Narsimha", "Son of Sardaar 2"]
+POSTER_CARD_TITLE = "ipc-poster-card__title"
+
+trending_titles = []  # last good scrape
+
+def is_poster_card_title(css_class):
+    # Class attributes are still unsplit strings when parse_only filters them
+    return bool(css_class) and POSTER_CARD_TITLE in (css_class.split() if isinstance(css_class, str) else css_class)
+
+def scrape_trending_bollywood_movies():
+    """Scrape IMDb trending page for Bollywood movies (blocking; run in a thread)"""
     headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
+    response = requests.get(TRENDING_URL, headers=headers, timeout=10)
+    response.raise_for_status()
+    # Only the poster-card title nodes are built into the tree
+    soup = BeautifulSoup(response.content, "lxml", parse_only=SoupStrainer(class_=is_poster_card_title))
     movies = []
+    for tag in soup.find_all(class_=POSTER_CARD_TITLE):
+        title = tag.get_text(strip=True)
+        if title and title not in movies:
+            movies.append(title)
+    return movies
+
+async def refresh_trending(context: ContextTypes.DEFAULT_TYPE | None = None):
+    global trending_titles
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.content, "html.parser")
-            # Updated selector based on current IMDb structure
-            for tag in soup.select(".ipc-poster-card__title"):
-                title = tag.get_text(strip=True)
-                if title and title not in movies:
-                    movies.append(title)
+        movies = await asyncio.to_thread(scrape_trending_bollywood_movies)
     except Exception as e:
-        print(f"Error fetching trending movies: {e}")
-    
-    # Fallback movies if scraping fails
-    return movies or ["Coolie", "War 2", "Kingdom", "Mahavatar Narsimha", "Son of Sardaar 2"]
-
-# Function to delete bot's messages after a delay
-async def delete_bot_message(context):
-    data = context.job.data
-    message = data.get("message")
-    if message:
+        print(f"Error fetching trending movies, keeping the last good list: {e}")
+        return
+    if movies:
+        trending_titles = movies
+        for title in movies:
+            await remember_title(title)
+    else:
+        print("Trending page had no titles, keeping the last good list")
+
+# Function to get trending Bollywood movies (no network I/O)
+def get_trending_bollywood_movies():
+    # Fallback movies until the first scrape succeeds
+    return trending_titles or FALLBACK_TRENDING
+
+# Local title dictionary for spelling correction: every title OMDb confirmed plus trending
+known_titles = TitleIndex()
+known_titles_coll = None  # Mongo copy when MONGO_URI is set
+
+async def remember_title(title):
+    key = normalize_title(title)
+    if not key or ("movie", key) in known_titles:
+        return
+    known_titles.add({"title": title}, "movie", key)
+    if known_titles_coll is not None:
         try:
-            await message.delete()
+            await known_titles_coll.update_one({"_id": key}, {"$set": {"title": title}}, upsert=True)
         except Exception as e:
-            print(f"Error deleting message: {e}")
+            print(f"Error saving known title {title}: {e}")
+
+# OMDb lookup off the event loop; hits feed the local title dictionary
+async def get_omdb(title):
+    try:
+        response = await asyncio.to_thread(
+            requests.get, "http://www.omdbapi.com/", params={"t": title, "apikey": IMDB_API_KEY}, timeout=10
+        )
+        data = response.json()
+    except Exception as e:
+        print(f"Error looking up {title}: {e}")
+        return {"Response": "False"}
+    if data.get("Response") == "True":
+        await remember_title(data.get("Title"))
+    return data
+
+# Welcome cards: fonts, mask and background are prepared once
+welcome_renderer = WelcomeRenderer()
+
+# Pending auto-deletes; persisted when MONGO_URI is set so they survive restarts
+MONGO_URI = os.getenv("MONGO_URI")
+deletions = DeletionQueue()
+
+async def load_known_titles(coll):
+    global known_titles_coll
+    known_titles_coll = coll
+    try:
+        async for doc in coll.find({}, {"title": 1}):
+            known_titles.add({"title": doc["title"]}, "movie", doc["_id"])
+        print(f"Loaded {len(known_titles)} known titles")
+    except Exception as e:
+        print(f"Error loading known titles: {e}")
+
+async def post_init(app: Application):
+    coll = None
+    if MONGO_URI:
+        db = AsyncIOMotorClient(MONGO_URI).get_default_database("telegram_bot")
+        coll = db["pending_deletions"]
+        await fun_facts_cache.bind(db["fun_facts"])
+        await load_known_titles(db["known_titles"])
+    await deletions.attach(app, coll)
+    await refresh_trending()
+    for title in get_trending_bollywood_movies():
+        await remember_title(title)
 
 # Greeting based on time of day
 def get_time_based_greeting():
@@ -87,62 +163,46 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     greeting = get_time_based_greeting()
     welcome_text = f"{greeting}😊\n\nɪ'ᴍ ᴀᴅᴠᴀɴᴄᴇᴅ ᴀɪ ʙᴏᴛ ʜᴇʟᴘ ʏᴏᴜ ᴛᴏ ғɪɴᴅ ʏᴏᴜʀ ғᴀᴠᴏʀɪᴛᴇ ᴍᴏᴠɪᴇs ᴅᴇᴛᴀɪʟs.\nᴊᴜsᴛ ᴛʏᴘᴇ ᴍᴏᴠɪᴇ ɴᴀᴍᴇ ɪ'ʟʟ ᴘʀᴏᴠɪᴅᴇ ʏᴏᴜ ᴍᴏᴠɪᴇ ᴅᴇᴛᴀɪʟs ᴀs ᴡᴇʟʟ ᴀs ᴅᴏᴡɴʟᴏᴀᴅ ʟɪɴᴋ.\n\nᴀɴʏ ǫᴜᴇsᴛɪᴏɴ ᴜsᴇ ᴛʜɪs ᴄᴏᴍᴍᴀɴᴅ - /ai 𝚢𝚘𝚞𝚛 𝚚𝚞𝚎𝚜𝚝𝚒𝚘𝚗.\n𝗠𝗔𝗗𝗘 𝗪𝗜𝗧𝗛 ❤ 𝗯𝘆 @Lordsakunaa"
     message = await update.message.reply_text(welcome_text)
-    context.job_queue.run_once(delete_bot_message, 100, data={"message": message})
+    await deletions.schedule(message, 100)
 
 # Welcome new members with custom square image
-async def welcome(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    for new_member in update.message.new_chat_members:
-        user_name = new_member.full_name or "Unknown User"
-        user_id = new_member.id
-        username = new_member.username or "No Username"
+async def welcome_member(bot, chat_id, new_member):
+    user_name = new_member.full_name or "Unknown User"
+    user_id = new_member.id
+    username = new_member.username or "No Username"
 
-        # Fetch user profile photo
-        try:
-            photos = await context.bot.get_user_profile_photos(user_id)
-            if photos.total_count > 0:
-                photo_file = await context.bot.get_file(photos.photos[0][0].file_id)
-                photo_bytes = await photo_file.download_as_bytearray()
-                user_photo = Image.open(io.BytesIO(photo_bytes))
-            else:
-                user_photo = Image.new("RGB", (400, 400), (128, 128, 128))
-        except Exception as e:
-            print(f"Error fetching profile photo: {e}")
-            user_photo = Image.new("RGB", (400, 400), (128, 128, 128))
-
-        # Create a square image (400x400) with circular DP
-        background = Image.new("RGB", (400, 400), "white")
-        draw = ImageDraw.Draw(background)
-        user_photo = user_photo.resize((300, 300)).convert("RGBA")
-        mask = Image.new("L", user_photo.size, 0)
-        draw_mask = ImageDraw.Draw(mask)
-        draw_mask.ellipse((0, 0) + user_photo.size, fill=255)
-        background.paste(user_photo, (50, 50), mask)
-
-        # Add username at the bottom center
-        try:
-            font = ImageFont.truetype(random.choice(["arial.ttf", "times.ttf", "calibri.ttf"]), 24)
-        except IOError:
-            font = ImageFont.load_default()
+    # Rendered in the welcome worker pool; avatars are cached by file_unique_id
+    output = await welcome_renderer.render(bot, new_member, user_name)
 
-        text_bbox = font.getbbox(user_name)
-        text_width = text_bbox[2] - text_bbox[0]
-        text_x = (400 - text_width) // 2
-        draw.text((text_x, 350), user_name, fill="black", font=font, align="center")
+    try:
+        message = await bot.send_photo(
+            chat_id=chat_id,
+            photo=output,
+            caption=f"𝐖𝐄𝐋𝐂𝐎𝐌𝐄❤\n\n👤 Name: {user_name}\n🆔 ID: {user_id}\n🔗 Username: @{username}\n\nᴛʏᴘᴇ ᴀɴʏ ᴍᴏᴠɪᴇ ɴᴀᴍᴇ ɪɴ ᴛʜɪs ɢʀᴏᴜᴘ ɪ'ʟʟ ᴘʀᴏᴠɪᴅᴇ ɪᴛ ᴛᴏ ʏᴏᴜ😊\nᴀɴʏ ǫᴜᴇsᴛɪᴏɴ ᴜsᴇ - /ai 𝚢𝚘𝚞𝚛 𝚚𝚞𝚎𝚜𝚝𝚒𝚘𝚗"
+        )
+        await deletions.schedule(message, 100)
+    except Exception as e:
+        print(f"Error sending welcome image: {e}")
 
-        # Save and send the image
-        output = io.BytesIO()
-        background.save(output, format="PNG")
-        output.seek(0)
+# Welcome a burst of new members with one collage instead of a card each
+WELCOME_BURST_CAPTION = "𝐖𝐄𝐋𝐂𝐎𝐌𝐄❤\n\n👥 {names}\n\nᴛʏᴘᴇ ᴀɴʏ ᴍᴏᴠɪᴇ ɴᴀᴍᴇ ɪɴ ᴛʜɪs ɢʀᴏᴜᴘ ɪ'ʟʟ ᴘʀᴏᴠɪᴅᴇ ɪᴛ ᴛᴏ ʏᴏᴜ😊\nᴀɴʏ ǫᴜᴇsᴛɪᴏɴ ᴜsᴇ - /ai 𝚢𝚘𝚞𝚛 𝚚𝚞𝚎𝚜𝚝𝚒𝚘𝚗"
 
-        try:
-            message = await context.bot.send_photo(
-                chat_id=update.message.chat_id,
-                photo=output,
-                caption=f"𝐖𝐄𝐋𝐂𝐎𝐌𝐄❤\n\n👤 Name: {user_name}\n🆔 ID: {user_id}\n🔗 Username: @{username}\n\nᴛʏᴘᴇ ᴀɴʏ ᴍᴏᴠɪᴇ ɴᴀᴍᴇ ɪɴ ᴛʜɪs ɢʀᴏᴜᴘ ɪ'ʟʟ ᴘʀᴏᴠɪᴅᴇ ɪᴛ ᴛᴏ ʏᴏᴜ😊\nᴀɴʏ ǫᴜᴇsᴛɪᴏɴ ᴜsᴇ - /ai 𝚢𝚘𝚞𝚛 𝚚𝚞𝚎𝚜𝚝𝚒𝚘𝚗"
-            )
-            context.job_queue.run_once(delete_bot_message, 100, data={"message": message})
-        except Exception as e:
-            print(f"Error sending welcome image: {e}")
+async def welcome_members(bot, chat_id, members, collage):
+    try:
+        message = await bot.send_photo(
+            chat_id=chat_id,
+            photo=collage,
+            caption=burst_caption(WELCOME_BURST_CAPTION, members)
+        )
+        await deletions.schedule(message, 100)
+    except Exception as e:
+        print(f"Error sending welcome collage: {e}")
+
+# Joins are buffered per chat so a mass join gets one welcome
+join_bursts = JoinAggregator(welcome_renderer, welcome_member, welcome_members)
+
+async def welcome(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    join_bursts.add(context.bot, update.effective_chat.id, update.message.new_chat_members)
 
 # Enhanced movie info fetcher with AI correction
 async def fetch_movie_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -150,9 +210,15 @@ async def fetch_movie_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     movie_name = update.message.text.strip()
-    url = f"http://www.omdbapi.com/?t={movie_name}&apikey={IMDB_API_KEY}"
-    response = requests.get(url)
-    data = response.json()
+    data = await get_omdb(movie_name)
+
+    if data.get("Response") != "True":
+        # Likely a typo: retry OMDb with the closest known title before asking Gemini
+        match = known_titles.best(movie_name, INDEX_MATCH_SCORE)
+        if match and normalize_title(match.title) != normalize_title(movie_name):
+            data = await get_omdb(match.title)
+            if data.get("Response") == "True":
+                print(f"Corrected '{movie_name}' to '{match.title}' locally (score {match.score})")
 
     if data.get("Response") == "True":
         # Movie found - show full details with fun facts
@@ -168,7 +234,7 @@ async def fetch_movie_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         
         # Get AI-generated fun facts
-        fun_facts = generate_ai_content(f"Give me some interesting fun facts about the movie {data.get('Title')}.")
+        fun_facts = await fun_facts_cache.get(data)
         final_caption = details + fun_facts
         
         poster_url = data.get("Poster")
@@ -191,17 +257,17 @@ async def fetch_movie_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 reply_markup=download_button
             )
     else:
-        # Movie not found - try AI correction
+        # Movie not found and no confident local match - try AI correction
         trending_movies = get_trending_bollywood_movies()
-        close_matches = difflib.get_close_matches(movie_name, trending_movies, n=1, cutoff=0.6)
+        close_matches = known_titles.search(movie_name, limit=1)
         
         if close_matches:
-            corrected_movie = close_matches[0]
+            corrected_movie = close_matches[0].title
             correction_prompt = f"The user searched for '{movie_name}' but I think they meant '{corrected_movie}'. Provide the corrected movie name in bold and give a brief description of the movie."
-            ai_response = generate_ai_content(correction_prompt)
+            ai_response = await generate_ai_content(correction_prompt)
         else:
             correction_prompt = f"The user searched for a movie called '{movie_name}' but it wasn't found. Suggest the most likely correct movie name in bold and provide some details about it."
-            ai_response = generate_ai_content(correction_prompt)
+            ai_response = await generate_ai_content(correction_prompt)
         
         message = await update.message.reply_text(
             ai_response,
@@ -220,7 +286,7 @@ async def fetch_movie_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
     # Schedule deletion after 5 minutes
-    context.job_queue.run_once(delete_bot_message, 300, data={"message": message})
+    await deletions.schedule(message, 300)
 
 # Download button callback handler
 async def handle_download_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -243,9 +309,7 @@ async def send_movie_suggestion(context: ContextTypes.DEFAULT_TYPE):
     suggestion_index = (suggestion_index + 1) % len(trending_movies)
     
     # Get movie details from OMDb
-    url = f"http://www.omdbapi.com/?t={movie_name}&apikey={IMDB_API_KEY}"
-    response = requests.get(url)
-    data = response.json()
+    data = await get_omdb(movie_name)
     
     if data.get("Response") == "True":
         details = (
@@ -261,7 +325,7 @@ async def send_movie_suggestion(context: ContextTypes.DEFAULT_TYPE):
         )
         
         # Get fun facts for the suggestion
-        fun_facts = generate_ai_content(f"Give me some fun facts about the movie {movie_name}.")
+        fun_facts = await fun_facts_cache.get(data)
         final_caption = details + fun_facts
         
         poster_url = data.get("Poster")
@@ -288,7 +352,17 @@ async def send_movie_suggestion(context: ContextTypes.DEFAULT_TYPE):
             )
         
         # Auto-delete after 5 minutes
-        context.job_queue.run_once(delete_bot_message, 300, data={"message": msg})
+        await deletions.schedule(msg, 300)
+
+# Pre-generate fun facts for the trending titles suggestions will use
+async def warm_fun_facts(context: ContextTypes.DEFAULT_TYPE):
+    infos = []
+    for movie_name in get_trending_bollywood_movies():
+        data = await get_omdb(movie_name)
+        if data.get("Response") == "True":
+            infos.append(data)
+    warmed = await fun_facts_cache.warm(infos)
+    print(f"Fun facts ready for {len(infos)} trending titles ({warmed} newly checked)")
 
 # Next button handler for suggestions
 async def handle_suggest_next(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -301,9 +375,7 @@ async def handle_suggest_next(update: Update, context: ContextTypes.DEFAULT_TYPE
     suggestion_index = (suggestion_index + 1) % len(trending_movies)
     
     # Get movie details
-    url = f"http://www.omdbapi.com/?t={movie_name}&apikey={IMDB_API_KEY}"
-    response = requests.get(url)
-    data = response.json()
+    data = await get_omdb(movie_name)
     
     if data.get("Response") == "True":
         details = (
@@ -318,7 +390,7 @@ async def handle_suggest_next(update: Update, context: ContextTypes.DEFAULT_TYPE
             f"🎞️ *Cast*: {data.get('Actors')}\n\n\n"
         )
         
-        fun_facts = generate_ai_content(f"Give me some fun facts about the movie {movie_name}.")
+        fun_facts = await fun_facts_cache.get(data)
         final_caption = details + fun_facts
         poster_url = data.get("Poster")
         
@@ -337,7 +409,7 @@ async def handle_suggest_next(update: Update, context: ContextTypes.DEFAULT_TYPE
                     parse_mode="Markdown",
                     reply_markup=keyboard
                 )
-                context.job_queue.run_once(delete_bot_message, 300, data={"message": new_msg})
+                await deletions.schedule(new_msg, 300)
             else:
                 # Edit existing message
                 await query.edit_message_text(
@@ -352,17 +424,21 @@ async def handle_suggest_next(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def ai_response(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if len(context.args) == 0:
         message = await update.message.reply_text("Please provide a question. Usage: /ai <your question>😊")
-        context.job_queue.run_once(delete_bot_message, 100, data={"message": message})
+        await deletions.schedule(message, 100)
         return
 
     question = " ".join(context.args)
-    ai_reply = generate_ai_content(question)
-    message = await update.message.reply_text(ai_reply)
-    context.job_queue.run_once(delete_bot_message, 100, data={"message": message})
+    # Placeholder right away, edited as the answer streams in; a newer /ai
+    # from the same user in this chat replaces this one. Deletion after 100
+    # seconds is scheduled even if the final edit fails
+    await stream_reply(
+        llm, update.message, question, key=(update.effective_chat.id, update.effective_user.id),
+        on_done=lambda m: deletions.schedule(m, 100),
+    )
 
 # Main function
 def main():
-    app = Application.builder().token(BOT_TOKEN).build()
+    app = Application.builder().token(BOT_TOKEN).post_init(post_init).build()
 
     # Add handlers
     app.add_handler(CommandHandler("start", start))
@@ -375,6 +451,12 @@ def main():
     # Schedule automated suggestions every 10 minutes
     app.job_queue.run_repeating(send_movie_suggestion, interval=600, first=10)
 
+    # Re-scrape the trending list in the background; readers only see the cached copy
+    app.job_queue.run_repeating(refresh_trending, interval=TRENDING_REFRESH_SECONDS, first=TRENDING_REFRESH_SECONDS)
+
+    # Keep fun facts for trending titles generated ahead of the suggestions
+    app.job_queue.run_repeating(warm_fun_facts, interval=3600, first=5)
+
     # Run webhook
     app.run_webhook(
         listen="0.0.0.0",
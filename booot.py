@@ -1,11 +1,14 @@
 import os
 import requests
 import google.generativeai as genai
-from telegram import Update, InputFile
+from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 from datetime import datetime
 from langdetect import detect
-from PIL import Image, ImageDraw, ImageFont
+from motor.motor_asyncio import AsyncIOMotorClient
+from autodelete import DeletionQueue
+from llm import LLMClient, stream_reply
+from welcome import WelcomeRenderer, JoinAggregator, LAYOUT_BANNER, burst_caption
 
 # Environment variables
 BOT_TOKEN = os.getenv("BOT_TOKEN")
@@ -17,25 +20,25 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "AIzaSyB4pvkedwMTVVjPp-OzbmTL8SgVJI
 genai.configure(api_key=GEMINI_API_KEY)
 model = genai.GenerativeModel("gemini-1.5-flash")
 
+# Async Gemini client: bounded concurrency, deadlines and backpressure
+llm = LLMClient(model)
+
 # Function to generate AI content
-def generate_ai_content(prompt: str) -> str:
-    try:
-        response = model.generate_content(prompt)
-        return response.text if response else "No response generated."
-    except Exception as e:
-        print(f"Error generating AI response: {e}")
-        return "Error generating AI response."
-
-# Function to delete bot's own messages
-async def delete_bot_message(context: ContextTypes.DEFAULT_TYPE):
-    data = context.job.data
-    message = data.get("message")
-
-    if message:
-        try:
-            await message.delete()
-        except Exception as e:
-            print(f"Error deleting message: {e}")
+async def generate_ai_content(prompt: str) -> str:
+    return await llm.generate(prompt)
+
+# Welcome banners: font and background are prepared once
+welcome_renderer = WelcomeRenderer(LAYOUT_BANNER)
+
+# Pending auto-deletes; persisted when MONGO_URI is set so they survive restarts
+MONGO_URI = os.getenv("MONGO_URI")
+deletions = DeletionQueue()
+
+async def post_init(app: Application):
+    coll = None
+    if MONGO_URI:
+        coll = AsyncIOMotorClient(MONGO_URI).get_default_database("telegram_bot")["pending_deletions"]
+    await deletions.attach(app, coll)
 
 # Custom greeting based on time of day
 def get_time_based_greeting():
@@ -56,7 +59,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = await update.message.reply_text(welcome_text)
 
     # Schedule deletion after 30 seconds
-    context.job_queue.run_once(delete_bot_message, 30, data={"message": message})
+    await deletions.schedule(message, 30)
 
 # IMDb information fetcher
 async def fetch_movie_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -82,59 +85,48 @@ async def fetch_movie_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
             message = await update.message.reply_text(reply_text, parse_mode="Markdown")
     else:
         # Fallback to AI response if movie not found
-        ai_reply = generate_ai_content(f"Suggest popular movies similar to {movie_name}.")
+        ai_reply = await generate_ai_content(f"Suggest popular movies similar to {movie_name}.")
         message = await update.message.reply_text(ai_reply)
 
     # Schedule deletion after 30 seconds
-    context.job_queue.run_once(delete_bot_message, 30, data={"message": message})
+    await deletions.schedule(message, 30)
 
 # Welcome new users and add DP inside rectangular background image
-async def welcome(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    for new_member in update.message.new_chat_members:
-        # Fetch user profile photos
-        photos = await context.bot.get_user_profile_photos(new_member.id)
-        if photos.total_count > 0:
-            photo_file_id = photos.photos[0][0].file_id
-            photo_file = await context.bot.get_file(photo_file_id)
-            photo_path = f"{new_member.id}_photo.jpg"
-            await photo_file.download_to_drive(photo_path)
-
-            # Create a custom welcome image
-            bg_image = Image.new("RGB", (600, 300), (255, 255, 255))
-            draw = ImageDraw.Draw(bg_image)
-            font = ImageFont.load_default()
-
-            # Add text
-            draw.text((20, 20), f"Welcome, {new_member.full_name}!", fill="black", font=font)
-
-            # Add DP to the background
-            user_photo = Image.open(photo_path).resize((100, 100))
-            bg_image.paste(user_photo, (20, 100))
-
-            # Save and send image
-            welcome_image_path = f"{new_member.id}_welcome.jpg"
-            bg_image.save(welcome_image_path)
-            message = await context.bot.send_photo(chat_id=update.message.chat_id, photo=InputFile(welcome_image_path))
-
-            os.remove(photo_path)
-            os.remove(welcome_image_path)
-        else:
-            message = await update.message.reply_text(f"Welcome, {new_member.full_name}!")
+async def welcome_member(bot, chat_id, new_member):
+    # Fetch user profile photo (cached by file_unique_id)
+    avatar = await welcome_renderer.avatar(bot, new_member)
+    if avatar is not None:
+        # Create a custom welcome image in memory, off the event loop
+        welcome_image = await welcome_renderer.compose(avatar, new_member.full_name)
+        message = await bot.send_photo(chat_id=chat_id, photo=welcome_image)
+    else:
+        message = await bot.send_message(chat_id=chat_id, text=f"Welcome, {new_member.full_name}!")
 
-        # Schedule deletion after 30 seconds
-        context.job_queue.run_once(delete_bot_message, 30, data={"message": message})
+    # Schedule deletion after 30 seconds
+    await deletions.schedule(message, 30)
+
+# Welcome a burst of new users with one collage
+async def welcome_members(bot, chat_id, members, collage):
+    message = await bot.send_photo(chat_id=chat_id, photo=collage, caption=burst_caption("Welcome, {names}!", members))
+    await deletions.schedule(message, 30)
+
+# Joins are buffered per chat so a mass join gets one welcome
+join_bursts = JoinAggregator(welcome_renderer, welcome_member, welcome_members)
+
+async def welcome(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    join_bursts.add(context.bot, update.effective_chat.id, update.message.new_chat_members)
 
 # Admin commands (Mute user)
 async def mute(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message.reply_to_message:
         message = await update.message.reply_text("Reply to a user's message to mute them.")
-        context.job_queue.run_once(delete_bot_message, 30, data={"message": message})
+        await deletions.schedule(message, 30)
         return
 
     user_id = update.message.reply_to_message.from_user.id
     await context.bot.restrict_chat_member(chat_id=update.message.chat_id, user_id=user_id, permissions={})
     message = await update.message.reply_text(f"User {update.message.reply_to_message.from_user.full_name} has been muted.")
-    context.job_queue.run_once(delete_bot_message, 30, data={"message": message})
+    await deletions.schedule(message, 30)
 
 # Keyword triggers
 KEYWORDS = {"hello": "Hi there! How can I help you?", "rules": "Please follow the group rules: Be respectful, no spamming."}
@@ -143,35 +135,37 @@ async def keyword_trigger(update: Update, context: ContextTypes.DEFAULT_TYPE):
     for keyword, response in KEYWORDS.items():
         if keyword in update.message.text.lower():
             message = await update.message.reply_text(response)
-            context.job_queue.run_once(delete_bot_message, 30, data={"message": message})
+            await deletions.schedule(message, 30)
             return
 
 # Multi-language support
 async def multi_language_response(update: Update, context: ContextTypes.DEFAULT_TYPE):
     detected_language = detect(update.message.text)
     if detected_language != "en":
-        translated_text = generate_ai_content(f"Translate this to English: {update.message.text}")
+        translated_text = await generate_ai_content(f"Translate this to English: {update.message.text}")
         message = await update.message.reply_text(f"Translation: {translated_text}")
-        context.job_queue.run_once(delete_bot_message, 30, data={"message": message})
+        await deletions.schedule(message, 30)
 
 # AI response using Gemini API
 async def ai_response(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if len(context.args) == 0:
         message = await update.message.reply_text("Please provide a question. Usage: /ai <your question>")
-        context.job_queue.run_once(delete_bot_message, 30, data={"message": message})
+        await deletions.schedule(message, 30)
         return
 
     question = " ".join(context.args)
-    ai_reply = generate_ai_content(question)
-    message = await update.message.reply_text(ai_reply)
-
-    # Schedule deletion after 30 seconds
-    context.job_queue.run_once(delete_bot_message, 30, data={"message": message})
+    # Placeholder right away, edited as the answer streams in; a newer /ai
+    # from the same user in this chat replaces this one. Deletion after 30
+    # seconds is scheduled even if the final edit fails
+    await stream_reply(
+        llm, update.message, question, key=(update.effective_chat.id, update.effective_user.id),
+        on_done=lambda m: deletions.schedule(m, 30),
+    )
 
 # Main function
 def main():
     # Create Application
-    app = Application.builder().token(BOT_TOKEN).build()
+    app = Application.builder().token(BOT_TOKEN).post_init(post_init).build()
 
     # Handlers
     app.add_handler(CommandHandler("start", start))
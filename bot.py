@@ -1,11 +1,20 @@
 import os
 import random
-import requests
 import logging
+from dataclasses import dataclass
 from datetime import datetime
 from io import BytesIO
-from PIL import Image
-from pymongo import MongoClient
+
+from httpclient import http
+from catalog import Catalog
+from images import ImagePipeline, PhotoCache, VARIANT_16_9, VARIANT_ORIGINAL
+from resolver import MediaResolver, ResolvedMedia
+from prefetch import Prefetcher
+from outbound import Broadcaster, PriorityRateLimiter
+from autodelete import DeletionQueue
+from trending import TrendingService
+from titleindex import TitleIndex
+from catalogwatch import CatalogWatcher
 
 from telegram import (
     Update,
@@ -13,6 +22,7 @@ from telegram import (
     InlineKeyboardMarkup,
     constants,
 )
+from telegram.error import BadRequest
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -50,17 +60,23 @@ TARGET_CHAT_IDS = [
 
 BROADCAST_CHANNEL_ID = -1002097771669
 
+# /add fans out to every channel listed here (comma-separated ids)
+BROADCAST_CHANNEL_IDS = [
+    int(c) for c in os.getenv("BROADCAST_CHANNEL_IDS", str(BROADCAST_CHANNEL_ID)).split(",") if c.strip()
+]
+
 # ──────────────────── DATABASE ────────────────────
-try:
-    client       = MongoClient(MONGO_URI)
-    db           = client.get_default_database()
-    movies       = db["movie"]
-    tvshows      = db["tv"]
-    herosection  = db["herosection"]   # NEW collection for auto-post
-    logger.info("Database connection established successfully")
-except Exception as e:
-    logger.error(f"Failed to connect to database: {e}")
-    raise
+catalog = Catalog(MONGO_URI)
+photo_cache = PhotoCache()   # (image URL, variant) → Telegram file_id
+image_pipeline = ImagePipeline()
+title_index = TitleIndex()   # typo-tolerant lookups over the catalog titles
+resolver = MediaResolver(catalog, TMDB_API_KEY, IMDB_API_KEY, FRONTEND_URL, DEFAULT_REGION, title_index)
+trending = TrendingService(resolver)   # refreshed in the background, served from memory
+watcher = CatalogWatcher(catalog)      # admin edits → title index, negative cache, hero cards
+
+broadcaster = Broadcaster()
+outbound = PriorityRateLimiter()   # interactive > broadcast > cleanup for every Bot API call
+deletions = DeletionQueue()        # batched, restart-safe auto-delete
 
 posted_movie_ids = set()
 
@@ -72,62 +88,12 @@ def greeting() -> str:
     if 18 <= h < 22: return "Good evening"
     return "Good night"
 
-def get_trailer(tmdb_id: int, media_type: str = "movie") -> str | None:
-    try:
-        if not tmdb_id: return None
-        url = f"https://api.themoviedb.org/3/{media_type}/{tmdb_id}/videos?api_key={TMDB_API_KEY}"
-        resp = requests.get(url, timeout=10); resp.raise_for_status()
-        for v in resp.json().get("results", []):
-            if v["site"].lower() == "youtube" and v["type"].lower() == "trailer":
-                return f"https://www.youtube.com/watch?v={v['key']}"
-    except Exception as e:
-        logger.error(f"Error fetching trailer for TMDB ID {tmdb_id}: {e}")
-    return None
-
-def get_platforms(tmdb_id: int, media_type: str = "movie") -> list[str]:
-    try:
-        if not tmdb_id: return []
-        url = f"https://api.themoviedb.org/3/{media_type}/{tmdb_id}/watch/providers?api_key={TMDB_API_KEY}"
-        resp = requests.get(url, timeout=10); resp.raise_for_status()
-        data = resp.json().get("results", {}).get(DEFAULT_REGION, {})
-        return [p["provider_name"] for p in data.get("flatrate", [])]
-    except Exception as e:
-        logger.error(f"Error fetching platforms for TMDB ID {tmdb_id}: {e}")
-    return []
-
-def crop_16_9(url: str) -> BytesIO | str | None:
-    try:
-        if not url or url in ["N/A", ""]: return None
-        resp = requests.get(url, timeout=10); resp.raise_for_status()
-        img = Image.open(BytesIO(resp.content))
-        w, h = img.size; nh = int(w * 9 / 16)
-        if h > nh:
-            top = (h-nh)//2
-            img  = img.crop((0,top,w,top+nh))
-        buf = BytesIO(); img.save(buf,"PNG"); buf.seek(0)
-        return buf
-    except Exception as e:
-        logger.error(f"Image crop failed for URL {url}: {e}")
-        return None
-
-def get_image_data(url: str) -> BytesIO | None:
-    """Fetch image data without cropping - for backdrop images"""
-    try:
-        if not url or url in ["N/A", ""]: return None
-        resp = requests.get(url, timeout=10); resp.raise_for_status()
-        img_data = BytesIO(resp.content)
-        img_data.seek(0)
-        return img_data
-    except Exception as e:
-        logger.error(f"Image fetch failed for URL {url}: {e}")
-        return None
+async def crop_16_9(url: str) -> BytesIO | None:
+    return await image_pipeline.prepare(url, VARIANT_16_9)
 
-async def delete_later(context: ContextTypes.DEFAULT_TYPE):
-    msg = context.job.data.get("msg")
-    try:
-        if msg: await msg.delete(); logger.debug("Deleted message")
-    except Exception as e:
-        logger.warning(f"Failed to delete message: {e}")
+async def get_image_data(url: str) -> BytesIO | None:
+    """Image without cropping - for backdrop images"""
+    return await image_pipeline.prepare(url, VARIANT_ORIGINAL)
 
 def build_caption(info: dict, platforms: list[str]) -> str:
     try:
@@ -166,18 +132,21 @@ def build_caption(info: dict, platforms: list[str]) -> str:
         logger.error(f"Error building caption: {e}")
         return "Error building movie information"
 
-def get_media_link(title: str) -> str:
-    try:
-        if not title: return FRONTEND_URL
-        doc = movies.find_one({"title": {"$regex": f"^{title}$", "$options":"i"}})
-        if doc and doc.get("tmdb_id"):
-            return f"{FRONTEND_URL}/mov/{doc['tmdb_id']}"
-        doc = tvshows.find_one({"title": {"$regex": f"^{title}$", "$options":"i"}})
-        if doc and doc.get("tmdb_id"):
-            return f"{FRONTEND_URL}/ser/{doc['tmdb_id']}"
-    except Exception as e:
-        logger.error(f"Error getting media link: {e}")
-    return FRONTEND_URL
+def build_hero_caption(media: ResolvedMedia) -> str:
+    """Caption for hero-section auto-posts (no director/cast in those docs)"""
+    info = media.info
+    cap = (
+        f"🎬 <b><u>{info.get('title', '-').upper()}</u></b>\n"
+        f"┏━━━━━━━━━━━━━━━━━━\n"
+        f"┃ <b>Year:</b> {info.get('release_year', '-')}\n"
+        f"┃ <b>IMDb:</b> ⭐ {info.get('rating', '-')}\n"
+        f"┃ <b>Genre:</b> {', '.join(info.get('genres', []))}\n"
+        f"┗━━━━━━━━━━━━━━━━━━\n\n"
+        f"<b>📝 Plot:</b>\n<em>{info.get('description', '-')}</em>\n"
+    )
+    if media.platforms:
+        cap += f"\n<b>📺 Streaming on:</b> {', '.join(media.platforms)}"
+    return cap
 
 def build_buttons(trailer: str | None, dl_link: str) -> InlineKeyboardMarkup:
     try:
@@ -194,6 +163,16 @@ def build_buttons(trailer: str | None, dl_link: str) -> InlineKeyboardMarkup:
         logger.error(f"Error building buttons: {e}")
         return InlineKeyboardMarkup([])
 
+async def send_card(bot, chat_id: int, poster: str | None, variant: str, load, caption: str, buttons: InlineKeyboardMarkup):
+    """Photo card via the file_id cache, falling back to a text message if no image"""
+    msg = await photo_cache.send(
+        poster, variant, load,
+        lambda photo: bot.send_photo(chat_id, photo=photo, caption=caption, parse_mode=constants.ParseMode.HTML, reply_markup=buttons)
+    )
+    if not msg:
+        msg = await bot.send_message(chat_id, text=caption, parse_mode=constants.ParseMode.HTML, reply_markup=buttons)
+    return msg
+
 # ──────────────────── HANDLERS ────────────────────
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
     logger.error(f"Exception during update handling: {context.error}", exc_info=context.error)
@@ -216,26 +195,38 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             WELCOME_IMAGE_URL, caption=text,
             parse_mode=constants.ParseMode.HTML, reply_markup=buttons
         )
-        context.job_queue.run_once(delete_later, AUTO_DELETE_SECONDS, data={"msg":msg})
+        await deletions.schedule(msg, AUTO_DELETE_SECONDS)
         logger.info(f"Handled /start for {update.effective_user.id}")
     except Exception as e:
         logger.error(f"Error in start handler: {e}")
 
+TRENDING_BUTTONS = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🎬 Today", callback_data="trending:movie:day"),
+     InlineKeyboardButton("🎬 This week", callback_data="trending:movie:week")],
+    [InlineKeyboardButton("📺 Today", callback_data="trending:tv:day"),
+     InlineKeyboardButton("📺 This week", callback_data="trending:tv:week")],
+])
+
 async def trending_cb(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        if not update.callback_query: return
-        await update.callback_query.answer()
-        resp = requests.get(
-            f"https://api.themoviedb.org/3/trending/movie/day?api_key={TMDB_API_KEY}",
-            timeout=10
-        ); resp.raise_for_status()
-        items = resp.json().get("results",[])[:5]
-        text="<b>🔥 Trending Movies:</b>\n\n"
-        for i, m in enumerate(items, 1):
-            text += f"<b>{i}.</b> {m['title']} ({m.get('release_date','')[:4]})\n"
-        msg = await update.callback_query.message.reply_text(text,parse_mode=constants.ParseMode.HTML)
-        context.job_queue.run_once(delete_later, AUTO_DELETE_SECONDS, data={"msg":msg})
-        logger.info("Displayed trending movies")
+        query = update.callback_query
+        if not query: return
+        # "trending" from the greeting, or "trending:<movie|tv>:<day|week>"
+        _, media_type, window = (query.data.split(":") + ["movie", "day"])[:3]
+        text = await trending.text(media_type, window)
+        if not text:
+            await query.answer("Trending list unavailable, try again later.")
+            return
+        await query.answer()
+        if query.data == "trending":
+            msg = await query.message.reply_text(text, parse_mode=constants.ParseMode.HTML, reply_markup=TRENDING_BUTTONS)
+            await deletions.schedule(msg, AUTO_DELETE_SECONDS)
+        else:
+            try:
+                await query.edit_message_text(text, parse_mode=constants.ParseMode.HTML, reply_markup=TRENDING_BUTTONS)
+            except BadRequest as e:
+                if "not modified" not in str(e): raise
+        logger.info(f"Displayed trending {media_type}/{window}")
     except Exception as e:
         logger.error(f"Error in trending_cb: {e}")
 
@@ -246,82 +237,22 @@ async def movie_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not query: return
         logger.info(f"Search query: {query}")
 
-        # First, try finding in local DB: movies, then tvshows
-        doc = movies.find_one({"title": {"$regex": f"^{query}$", "$options":"i"}})
-        result_type = "movie"
-        if not doc:
-            doc = tvshows.find_one({"title": {"$regex": f"^{query}$", "$options":"i"}})
-            result_type = "tv" if doc else "movie"
-
-        info = None; tmdb_id = None; trailer = None; platforms = []; poster = None
-
-        if doc:  # Found locally
-            info = doc
-            tmdb_id = doc.get("tmdb_id")
-            media_type = "movie" if result_type == "movie" else "tv"
-            trailer = get_trailer(tmdb_id, media_type)
-            platforms = get_platforms(tmdb_id, media_type)
-            poster = doc.get("backdrop") or doc.get("poster")
-        else:
-            # OMDb search as before
-            try:
-                omdb_resp = requests.get(f"http://www.omdbapi.com/?t={query}&apikey={IMDB_API_KEY}",timeout=10)
-                omdb_resp.raise_for_status()
-                omdb = omdb_resp.json()
-            except:
-                omdb = {"Response":"False"}
-            if omdb.get("Response") == "True":
-                info=omdb; tmdb_id = None; trailer = None; platforms = []
-                poster = omdb.get("Poster") if omdb.get("Poster")!="N/A" else None
-            else:
-                # TMDb fallback – Search Show first, then Movie
-                tmdb_searches = [
-                    ("movie", f"https://api.themoviedb.org/3/search/movie?api_key={TMDB_API_KEY}&query={query}"),
-                    ("tv", f"https://api.themoviedb.org/3/search/tv?api_key={TMDB_API_KEY}&query={query}")
-                ]
-                results = []
-                result_type = "movie"
-                for rtype, url in tmdb_searches:
-                    try:
-                        tmdb_s = requests.get(url,timeout=10)
-                        tmdb_s.raise_for_status()
-                        res = tmdb_s.json().get("results", [])
-                        if res:
-                            results = res
-                            result_type = rtype
-                            break
-                    except:
-                        continue
-                if not results:
-                    btn = InlineKeyboardMarkup([[InlineKeyboardButton("🔍 Try Google",url=f"https://www.google.com/search?q={query.replace(' ','+')}")]])
-                    msg = await update.message.reply_text("❗ Movie/Series not found.",parse_mode=constants.ParseMode.HTML,reply_markup=btn)
-                    context.job_queue.run_once(delete_later,AUTO_DELETE_SECONDS, data={"msg":msg})
-                    return
-                tmdb_id = results[0]["id"]
-                # Get details
-                detail_url = f"https://api.themoviedb.org/3/{result_type}/{tmdb_id}?api_key={TMDB_API_KEY}&append_to_response=credits"
-                try:
-                    det_r = requests.get(detail_url,timeout=10)
-                    det_r.raise_for_status()
-                    details = det_r.json()
-                except:
-                    details = results[0]
-                trailer = get_trailer(tmdb_id, result_type)
-                platforms = get_platforms(tmdb_id, result_type)
-                info = details
-                poster = (f"https://image.tmdb.org/t/p/w780{details.get('backdrop_path')}" if details.get("backdrop_path") else None)
-        caption = build_caption(info, platforms)
-        # Get proper link
-        media_link = get_media_link(info.get("title") or info.get("Title",""))
-        if media_link == FRONTEND_URL and tmdb_id:
-            media_link = f"{FRONTEND_URL}/{'mov' if result_type=='movie' else 'ser'}/{tmdb_id}"
-        buttons = build_buttons(trailer, media_link)
-        img = crop_16_9(poster)
-        if img:
-            msg = await update.message.reply_photo(img,caption=caption,parse_mode=constants.ParseMode.HTML,reply_markup=buttons)
-        else:
+        # Catalog → OMDb → TMDb, enriched with trailer, platforms and link
+        media = await resolver.resolve(query)
+        if not media:
+            btn = InlineKeyboardMarkup([[InlineKeyboardButton("🔍 Try Google",url=f"https://www.google.com/search?q={query.replace(' ','+')}")]])
+            msg = await update.message.reply_text("❗ Movie/Series not found.",parse_mode=constants.ParseMode.HTML,reply_markup=btn)
+            await deletions.schedule(msg, AUTO_DELETE_SECONDS)
+            return
+        caption = build_caption(media.info, media.platforms)
+        buttons = build_buttons(media.trailer, media.link)
+        msg = await photo_cache.send(
+            media.poster, VARIANT_16_9, crop_16_9,
+            lambda photo: update.message.reply_photo(photo,caption=caption,parse_mode=constants.ParseMode.HTML,reply_markup=buttons)
+        )
+        if not msg:
             msg = await update.message.reply_text(caption,parse_mode=constants.ParseMode.HTML,reply_markup=buttons)
-        context.job_queue.run_once(delete_later,AUTO_DELETE_SECONDS,data={"msg":msg})
+        await deletions.schedule(msg, AUTO_DELETE_SECONDS)
         logger.info(f"Completed search for {query}")
     except Exception as e:
         logger.error(f"Error in movie_search: {e}")
@@ -339,180 +270,160 @@ async def add_movie_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE
         query = " ".join(context.args)
         logger.info(f"Broadcasting: {query}")
 
-        doc = movies.find_one({"title": {"$regex": f"^{query}$", "$options":"i"}})
-        result_type = "movie"
-        if not doc:
-            doc = tvshows.find_one({"title": {"$regex": f"^{query}$", "$options":"i"}})
-            result_type = "tv" if doc else "movie"
-        info = None; tmdb_id=None; trailer=None; platforms=[]; poster=None
-
-        if doc:
-            info = doc
-            tmdb_id = doc.get("tmdb_id")
-            media_type = "movie" if result_type == "movie" else "tv"
-            trailer = get_trailer(tmdb_id, media_type)
-            platforms = get_platforms(tmdb_id, media_type)
-            poster = doc.get("backdrop") or doc.get("poster")
-        else:
-            try:
-                omdb_r = requests.get(f"http://www.omdbapi.com/?t={query}&apikey={IMDB_API_KEY}",timeout=10)
-                omdb_r.raise_for_status()
-                omdb = omdb_r.json()
-            except:
-                omdb = {"Response":"False"}
-            if omdb.get("Response") == "True":
-                info = omdb; tmdb_id = None; trailer = None; platforms = []
-                poster = omdb.get("Poster") if omdb.get("Poster")!="N/A" else None
-            else:
-                tmdb_searches = [
-                    ("movie", f"https://api.themoviedb.org/3/search/movie?api_key={TMDB_API_KEY}&query={query}"),
-                    ("tv", f"https://api.themoviedb.org/3/search/tv?api_key={TMDB_API_KEY}&query={query}")
-                ]
-                res = []; result_type="movie"
-                for rtype, url in tmdb_searches:
-                    try:
-                        s_r = requests.get(url,timeout=10)
-                        s_r.raise_for_status()
-                        rx = s_r.json().get("results", [])
-                        if rx:
-                            res = rx
-                            result_type = rtype
-                            break
-                    except:
-                        continue
-                if not res:
-                    await update.message.reply_text("❗ Movie/Series not found.")
-                    return
-                tmdb_id = res[0]["id"]
-                detail_url = f"https://api.themoviedb.org/3/{result_type}/{tmdb_id}?api_key={TMDB_API_KEY}&append_to_response=credits"
-                try:
-                    d_r = requests.get(detail_url,timeout=10)
-                    d_r.raise_for_status()
-                    details = d_r.json()
-                except:
-                    details = res[0]
-                trailer = get_trailer(tmdb_id, result_type)
-                platforms = get_platforms(tmdb_id, result_type)
-                info = details
-                poster = (f"https://image.tmdb.org/t/p/w780{details.get('backdrop_path')}" if details.get("backdrop_path") else None)
-        caption = build_caption(info,platforms)
-        media_link = get_media_link(info.get("title") or info.get("Title",""))
-        if media_link == FRONTEND_URL and tmdb_id:
-            media_link = f"{FRONTEND_URL}/{'mov' if result_type=='movie' else 'ser'}/{tmdb_id}"
-        buttons = build_buttons(trailer,media_link)
-        img = crop_16_9(poster)
-        if img:
-            await context.bot.send_photo(BROADCAST_CHANNEL_ID,img,caption=caption,parse_mode=constants.ParseMode.HTML,reply_markup=buttons)
-        else:
-            await context.bot.send_message(BROADCAST_CHANNEL_ID,caption,parse_mode=constants.ParseMode.HTML,reply_markup=buttons)
-        await update.message.reply_text(f"✅ Broadcasted '{query}'")
-        logger.info(f"Broadcasted {query}")
+        media = await resolver.resolve(query)
+        if not media:
+            await update.message.reply_text("❗ Movie/Series not found.")
+            return
+        caption = build_caption(media.info, media.platforms)
+        buttons = build_buttons(media.trailer, media.link)
+        report = await broadcaster.send(
+            BROADCAST_CHANNEL_IDS,
+            lambda cid: send_card(context.bot, cid, media.poster, VARIANT_16_9, crop_16_9, caption, buttons)
+        )
+        if not report.deliveries:
+            await update.message.reply_text("❗ No broadcast channels configured.")
+            return
+        if not report.sent:
+            raise RuntimeError(report.failed[0].error)
+        await update.message.reply_text(f"✅ Broadcasted '{query}' ({report.summary()})")
+        logger.info(f"Broadcasted {query}: {report.summary()}")
     except Exception as e:
         logger.error(f"Error in add_movie_broadcast: {e}")
         try: await update.message.reply_text("❗ Broadcast error. Try again.")
         except: pass
 
-AUTO_POST_INTERVAL = 600
-
-async def auto_post_job(context: ContextTypes.DEFAULT_TYPE):
+async def cache_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        hero_count = herosection.count_documents({})
-        if hero_count == 0:
-            logger.warning("No hero movies to auto-post")
-            return
-
-        pipeline = [{"$sample": {"size": 1}}]
-        docs = list(herosection.aggregate(pipeline))
-        if not docs: return
-
-        movie = docs[0]
-        title = movie.get("title", "-")
-        tmdb_id = movie.get("tmdb_id")
-        media_type = movie.get("media_type", "movie")
-        year = movie.get("release_year", "-")
-        rating = movie.get("rating", "-")
-        genre = ", ".join(movie.get("genres", []))
-        plot = movie.get("description", "-")
-
-        # Use backdrop image URL from document (preferred)
-        img_url = movie.get("backdrop")
-        # If backdrop missing, try poster URL from document
-        if not img_url:
-            img_url = movie.get("poster")
-
-        # If no valid URL in document, fallback to TMDb fetch
-        if not img_url and tmdb_id:
-            try:
-                detail_url = f"https://api.themoviedb.org/3/{media_type}/{tmdb_id}?api_key={TMDB_API_KEY}"
-                resp = requests.get(detail_url, timeout=10)
-                resp.raise_for_status()
-                details = resp.json()
-                backdrop_path = details.get("backdrop_path")
-                if backdrop_path:
-                    img_url = f"https://image.tmdb.org/t/p/original{backdrop_path}"
-                else:
-                    poster_path = details.get("poster_path")
-                    if poster_path:
-                        img_url = f"https://image.tmdb.org/t/p/original{poster_path}"
-            except Exception as e:
-                logger.error(f"Failed fetching TMDb image fallback for {tmdb_id}: {e}")
-
-        caption = (
-            f"🎬 <b><u>{title.upper()}</u></b>\n"
-            f"┏━━━━━━━━━━━━━━━━━━\n"
-            f"┃ <b>Year:</b> {year}\n"
-            f"┃ <b>IMDb:</b> ⭐ {rating}\n"
-            f"┃ <b>Genre:</b> {genre}\n"
-            f"┗━━━━━━━━━━━━━━━━━━\n\n"
-            f"<b>📝 Plot:</b>\n<em>{plot}</em>\n"
-        )
-
-        trailer = get_trailer(tmdb_id, media_type) if tmdb_id else None
-        platforms = get_platforms(tmdb_id, media_type) if tmdb_id else []
-        if platforms:
-            caption += f"\n<b>📺 Streaming on:</b> {', '.join(platforms)}"
+        if not update.message: return
+        if (update.effective_user.username or "") != ADMIN_USERNAME: return
+        lines = ["<b>📊 Cache stats</b>\n"]
+        for c in resolver.caches:
+            st = c.stats()
+            lines.append(
+                f"<b>{st['name']}</b>: {st['size']} items, hits {st['hits']}, "
+                f"stale {st['stale_hits']}, misses {st['misses']}, "
+                f"evicted {st['evictions']}, coalesced {st['coalesced']}, hit rate {st['hit_rate']:.0%}"
+            )
+        lines.append(f"<b>resolve</b>: {resolver.inflight.started} lookups, {resolver.inflight.shared} coalesced")
+        lines.append(f"<b>photos</b>: {photo_cache.uploads} uploads, {photo_cache.reuses} file_id reuses")
+        st = title_index.stats()
+        lines.append(f"<b>title index</b>: {st['titles']} titles, {st['trigrams']} trigrams, {st['searches']} searches, built in {st['build_ms']} ms")
+        st = watcher.stats()
+        lines.append(f"<b>catalog watch</b>: {st['mode']}, {st['events']} events, {st['errors']} errors")
+        lines.append(f"<b>trending</b>: {trending.refreshes} refreshes, {trending.failures} failures")
+        lines.append(f"<b>hero cards</b>: {hero_cards.prefetched} prefetched, {hero_cards.inline} built inline")
+        for name, st in outbound.stats().items():
+            if name != "queued":
+                lines.append(f"<b>{name} lane</b>: {st['calls']} calls, avg wait {st['avg_wait_ms']} ms")
+        lines.append(f"<b>auto-delete</b>: {len(deletions)} pending, {deletions.deleted} deleted, {deletions.failed} failed")
+        lines.append(f"<b>images</b>: {image_pipeline.renders} renders, {image_pipeline.disk_hits} disk hits")
+        msg = await update.message.reply_text("\n".join(lines), parse_mode=constants.ParseMode.HTML)
+        await deletions.schedule(msg, AUTO_DELETE_SECONDS)
+    except Exception as e:
+        logger.error(f"Error in cache_stats: {e}")
 
-        dl_link = f"{FRONTEND_URL}/{'mov' if media_type=='movie' else 'ser'}/{tmdb_id}"
-        buttons = build_buttons(trailer, dl_link)
+AUTO_POST_INTERVAL = 600
+HERO_PREFETCH_DEPTH = 2
+
+@dataclass
+class HeroCard:
+    media: ResolvedMedia
+    caption: str
+    buttons: InlineKeyboardMarkup
+
+async def build_hero_card() -> HeroCard | None:
+    """Sample a hero doc and prepare everything the post needs except the send"""
+    docs = await catalog.sample_heroes(1)
+    if not docs:
+        logger.warning("No hero movies to auto-post")
+        return None
+    media = await resolver.resolve_doc(docs[0])
+    # Warm the rendered image unless Telegram already has it as a file_id
+    if media.poster and not await photo_cache.get(media.poster, VARIANT_ORIGINAL):
+        await get_image_data(media.poster)
+    return HeroCard(media, build_hero_caption(media), build_buttons(media.trailer, media.link))
 
-        # Get image data without cropping (backdrop is already good)
-        img_data = get_image_data(img_url)
+hero_cards = Prefetcher("hero", build_hero_card, depth=HERO_PREFETCH_DEPTH)
 
-        for cid in TARGET_CHAT_IDS:
-            try:
-                if img_data:
-                    await context.bot.send_photo(
-                        cid,
-                        photo=img_data,
-                        caption=caption,
-                        parse_mode=constants.ParseMode.HTML,
-                        reply_markup=buttons
-                    )
-                else:
-                    # Fallback to text message if no image
-                    await context.bot.send_message(
-                        cid,
-                        text=caption,
-                        parse_mode=constants.ParseMode.HTML,
-                        reply_markup=buttons
-                    )
-                context.job_queue.run_once(delete_later, AUTO_DELETE_SECONDS, data={"msg": None})
-            except Exception as e:
-                logger.error(f"Auto-post to {cid} failed: {e}")
-
-        logger.info(f"Auto-hero-post completed for: {title}")
+async def auto_post_job(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        # Cards are built ahead of time; the tick only sends
+        card = await hero_cards.next()
+        if not card: return
+        media, caption, buttons = card.media, card.caption, card.buttons
+        title = media.info.get("title", "-")
+
+        async def post(cid: int):
+            # Image without cropping (backdrop is already good); uploaded
+            # once, later chats reuse the cached file_id
+            return await send_card(context.bot, cid, media.poster, VARIANT_ORIGINAL, get_image_data, caption, buttons)
+
+        report = await broadcaster.send(TARGET_CHAT_IDS, post)
+        logger.info(f"Auto-hero-post completed for: {title} ({report.summary()})")
     except Exception as e:
         logger.error(f"Error in auto_post_job: {e}")
 
+def on_title_change(media_type: str):
+    def apply(op: str, doc_id, doc: dict | None):
+        if op == "delete":
+            title_index.remove(media_type, doc_id)
+        else:
+            title_index.add(doc, media_type, doc_id)
+            resolver.negative.clear()   # a query that found nothing may now hit
+    return apply
+
+def on_hero_change(op: str, doc_id, doc: dict | None):
+    dropped = hero_cards.flush()
+    if dropped: logger.info(f"Hero section changed, dropped {dropped} prefetched card(s)")
+
+watcher.on("movie", on_title_change("movie"))
+watcher.on("tv", on_title_change("tv"))
+watcher.on("herosection", on_hero_change)
+
+async def post_init(app: Application):
+    await http.start()
+    await catalog.connect()
+    # Open the watch before reading the snapshot and buffer its events until
+    # the build is done, so edits made meanwhile are applied after it, not lost
+    watcher.hold()
+    watcher.start()
+    await watcher.ready()
+    try:
+        await title_index.build(catalog)
+    except Exception as e:
+        logger.error(f"Could not build title index: {e}")
+    finally:
+        watcher.release()
+    await photo_cache.bind(catalog.db["tg_file_ids"])
+    await deletions.attach(app, catalog.db["pending_deletions"])
+    hero_cards.start()
+    trending.start()
+
+async def post_shutdown(app: Application):
+    await watcher.stop()
+    await hero_cards.stop()
+    await trending.stop()
+    await http.close()
+    catalog.close()
+    image_pipeline.close()
+
 def main():
     try:
         logger.info("Starting bot")
-        app = Application.builder().token(BOT_TOKEN).build()
+        app = (
+            Application.builder()
+            .token(BOT_TOKEN)
+            .rate_limiter(outbound)
+            .post_init(post_init)
+            .post_shutdown(post_shutdown)
+            .build()
+        )
         app.add_handler(CommandHandler("start", start))
-        app.add_handler(CallbackQueryHandler(trending_cb, pattern="^trending$"))
+        app.add_handler(CallbackQueryHandler(trending_cb, pattern="^trending"))
         app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, movie_search))
         app.add_handler(MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, start))
         app.add_handler(CommandHandler("add", add_movie_broadcast))
+        app.add_handler(CommandHandler("stats", cache_stats))
         app.add_error_handler(error_handler)
         app.job_queue.run_repeating(auto_post_job, interval=AUTO_POST_INTERVAL, first=10)
         app.run_webhook(
@@ -1,12 +1,13 @@
 import os
-import random
 import requests
 import google.generativeai as genai
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 from datetime import datetime
-from PIL import Image, ImageDraw, ImageFont
-import io
+from motor.motor_asyncio import AsyncIOMotorClient
+from autodelete import DeletionQueue
+from llm import LLMClient, stream_reply
+from welcome import WelcomeRenderer, JoinAggregator, burst_caption
 
 # Environment variables
 BOT_TOKEN = os.getenv("BOT_TOKEN")
@@ -18,25 +19,25 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "AIzaSyB4pvkedwMTVVjPp-OzbmTL8SgVJI
 genai.configure(api_key=GEMINI_API_KEY)
 model = genai.GenerativeModel("gemini-1.5-flash")
 
+# Async Gemini client: bounded concurrency, deadlines and backpressure
+llm = LLMClient(model)
+
 # Function to generate AI content
-def generate_ai_content(prompt: str) -> str:
-    try:
-        response = model.generate_content(prompt)
-        return response.text if response else "No response generated."
-    except Exception as e:
-        print(f"Error generating AI response: {e}")
-        return "Error generating AI response."
+async def generate_ai_content(prompt: str) -> str:
+    return await llm.generate(prompt)
 
-# Function to delete bot's messages after a delay
-async def delete_bot_message(context):
-    data = context.job.data
-    message = data.get("message")
+# Welcome cards: fonts, mask and background are prepared once
+welcome_renderer = WelcomeRenderer()
 
-    if message:
-        try:
-            await message.delete()
-        except Exception as e:
-            print(f"Error deleting message: {e}")
+# Pending auto-deletes; persisted when MONGO_URI is set so they survive restarts
+MONGO_URI = os.getenv("MONGO_URI")
+deletions = DeletionQueue()
+
+async def post_init(app: Application):
+    coll = None
+    if MONGO_URI:
+        coll = AsyncIOMotorClient(MONGO_URI).get_default_database("telegram_bot")["pending_deletions"]
+    await deletions.attach(app, coll)
 
 # Greeting based on time of day
 def get_time_based_greeting():
@@ -56,69 +57,49 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     welcome_text = f"{greeting}😊\n\nɪ'ᴍ ᴀᴅᴠᴀɴᴄᴇᴅ ᴀɪ ʙᴏᴛ ʜᴇʟᴘ ʏᴏᴜ ᴛᴏ ғɪɴᴅ ʏᴏᴜʀ ғᴀᴠᴏʀɪᴛᴇ ᴍᴏᴠɪᴇs ᴅᴇᴛᴀɪʟs.\nᴊᴜsᴛ ᴛʏᴘᴇ ᴍᴏᴠɪᴇ ɴᴀᴍᴇ ɪ'ʟʟ ᴘʀᴏᴠɪᴅᴇ ʏᴏᴜ ᴍᴏᴠɪᴇ ᴅᴇᴛᴀɪʟs ᴀs ᴡᴇʟʟ ᴀs ᴅᴏᴡɴʟᴏᴀᴅ ʟɪɴᴋ.\n\nᴀɴʏ ǫᴜᴇsᴛɪᴏɴ ᴜsᴇ ᴛʜɪs ᴄᴏᴍᴍᴀɴᴅ - /ai 𝚢𝚘𝚞𝚛 𝚚𝚞𝚎𝚜𝚝𝚒𝚘𝚗.\n𝗠𝗔𝗗𝗘 𝗪𝗜𝗧𝗛 ❤ 𝗯𝘆 @Lordsakunaa"
     message = await update.message.reply_text(welcome_text)
 
-    # Schedule deletion after 30 seconds
-    context.job_queue.run_once(delete_bot_message, 100, data={"message": message})
+    # Schedule deletion after 100 seconds
+    await deletions.schedule(message, 100)
 
 # Welcome new members with custom square image
-async def welcome(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    for new_member in update.message.new_chat_members:
-        user_name = new_member.full_name or "Unknown User"
-        user_id = new_member.id
-        username = new_member.username or "No Username"
-
-        # Fetch user profile photo
-        try:
-            photos = await context.bot.get_user_profile_photos(user_id)
-            if photos.total_count > 0:
-                photo_file = await context.bot.get_file(photos.photos[0][0].file_id)
-                photo_bytes = await photo_file.download_as_bytearray()
-                user_photo = Image.open(io.BytesIO(photo_bytes))
-            else:
-                user_photo = Image.new("RGB", (400, 400), (128, 128, 128))  # Default gray
-        except Exception as e:
-            print(f"Error fetching profile photo: {e}")
-            user_photo = Image.new("RGB", (400, 400), (128, 128, 128))  # Default gray
-
-        # Create a square image (400x400) with circular DP
-        background = Image.new("RGB", (400, 400), "white")
-        draw = ImageDraw.Draw(background)
-
-        # Circular mask for user DP
-        user_photo = user_photo.resize((300, 300)).convert("RGBA")
-        mask = Image.new("L", user_photo.size, 0)
-        draw_mask = ImageDraw.Draw(mask)
-        draw_mask.ellipse((0, 0) + user_photo.size, fill=255)
-        background.paste(user_photo, (50, 50), mask)
-
-        # Add username at the bottom center of the image
-        try:
-            font = ImageFont.truetype(random.choice(["arial.ttf", "times.ttf", "calibri.ttf"]), 24)
-        except IOError:
-            font = ImageFont.load_default()
-
-        # Calculate text size using font.getbbox()
-        text_bbox = font.getbbox(user_name)
-        text_width = text_bbox[2] - text_bbox[0]
-        text_x = (400 - text_width) // 2
-        draw.text((text_x, 350), user_name, fill="black", font=font, align="center")
-
-        # Save the image to bytes
-        output = io.BytesIO()
-        background.save(output, format="PNG")
-        output.seek(0)
-
-        # Send the generated image to the group
-        try:
-            message = await context.bot.send_photo(
-                chat_id=update.message.chat_id,
-                photo=output,
-                caption=f"𝐖𝐄𝐋𝐂𝐎𝐌𝐄❤\n\n👤 Name: {user_name}\n🆔 ID: {user_id}\n🔗 Username: @{username}\n\nᴛʏᴘᴇ ᴀɴʏ ᴍᴏᴠɪᴇ ɴᴀᴍᴇ ɪɴ ᴛʜɪs ɢʀᴏᴜᴘ ɪ'ʟʟ ᴘʀᴏᴠɪᴅᴇ ɪᴛ ᴛᴏ ʏᴏᴜ😊\nᴀɴʏ ǫᴜᴇsᴛɪᴏɴ ᴜsᴇ - /ai 𝚢𝚘𝚞𝚛 𝚚𝚞𝚎𝚜𝚝𝚒𝚘𝚗"
-            )
+async def welcome_member(bot, chat_id, new_member):
+    user_name = new_member.full_name or "Unknown User"
+    user_id = new_member.id
+    username = new_member.username or "No Username"
+
+    # Rendered in the welcome worker pool; avatars are cached by file_unique_id
+    output = await welcome_renderer.render(bot, new_member, user_name)
 
-            # Schedule deletion after 30 seconds
-            context.job_queue.run_once(delete_bot_message, 100, data={"message": message})
-        except Exception as e:
-            print(f"Error sending welcome image: {e}")
+    try:
+        message = await bot.send_photo(
+            chat_id=chat_id,
+            photo=output,
+            caption=f"𝐖𝐄𝐋𝐂𝐎𝐌𝐄❤\n\n👤 Name: {user_name}\n🆔 ID: {user_id}\n🔗 Username: @{username}\n\nᴛʏᴘᴇ ᴀɴʏ ᴍᴏᴠɪᴇ ɴᴀᴍᴇ ɪɴ ᴛʜɪs ɢʀᴏᴜᴘ ɪ'ʟʟ ᴘʀᴏᴠɪᴅᴇ ɪᴛ ᴛᴏ ʏᴏᴜ😊\nᴀɴʏ ǫᴜᴇsᴛɪᴏɴ ᴜsᴇ - /ai 𝚢𝚘𝚞𝚛 𝚚𝚞𝚎𝚜𝚝𝚒𝚘𝚗"
+        )
+
+        # Schedule deletion after 100 seconds
+        await deletions.schedule(message, 100)
+    except Exception as e:
+        print(f"Error sending welcome image: {e}")
+
+# Welcome a burst of new members with one collage instead of a card each
+WELCOME_BURST_CAPTION = "𝐖𝐄𝐋𝐂𝐎𝐌𝐄❤\n\n👥 {names}\n\nᴛʏᴘᴇ ᴀɴʏ ᴍᴏᴠɪᴇ ɴᴀᴍᴇ ɪɴ ᴛʜɪs ɢʀᴏᴜᴘ ɪ'ʟʟ ᴘʀᴏᴠɪᴅᴇ ɪᴛ ᴛᴏ ʏᴏᴜ😊\nᴀɴʏ ǫᴜᴇsᴛɪᴏɴ ᴜsᴇ - /ai 𝚢𝚘𝚞𝚛 𝚚𝚞𝚎𝚜𝚝𝚒𝚘𝚗"
+
+async def welcome_members(bot, chat_id, members, collage):
+    try:
+        message = await bot.send_photo(
+            chat_id=chat_id,
+            photo=collage,
+            caption=burst_caption(WELCOME_BURST_CAPTION, members)
+        )
+        await deletions.schedule(message, 100)
+    except Exception as e:
+        print(f"Error sending welcome collage: {e}")
+
+# Joins are buffered per chat so a mass join gets one welcome
+join_bursts = JoinAggregator(welcome_renderer, welcome_member, welcome_members)
+
+async def welcome(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    join_bursts.add(context.bot, update.effective_chat.id, update.message.new_chat_members)
 
 # IMDb information fetcher with "Download Now" button
 async def fetch_movie_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -161,31 +142,33 @@ async def fetch_movie_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 reply_markup=download_button
             )
     else:
-        ai_response = generate_ai_content(f"Can you describe the movie '{movie_name}'?")
+        ai_response = await generate_ai_content(f"Can you describe the movie '{movie_name}'?")
         message = await update.message.reply_text(
             f"Movie not found in IMDb. Here's an AI-generated description👇:\n\n{ai_response}😊"
         )
 
-    # Schedule deletion after 30 seconds
-    context.job_queue.run_once(delete_bot_message, 100, data={"message": message})
+    # Schedule deletion after 100 seconds
+    await deletions.schedule(message, 100)
 
 # AI response command
 async def ai_response(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if len(context.args) == 0:
         message = await update.message.reply_text("Please provide a question. Usage: /ai <your question>😊")
-        context.job_queue.run_once(delete_bot_message, 100, data={"message": message})
+        await deletions.schedule(message, 100)
         return
 
     question = " ".join(context.args)
-    ai_reply = generate_ai_content(question)
-    message = await update.message.reply_text(ai_reply)
-
-    # Schedule deletion after 30 seconds
-    context.job_queue.run_once(delete_bot_message, 100, data={"message": message})
+    # Placeholder right away, edited as the answer streams in; a newer /ai
+    # from the same user in this chat replaces this one. Deletion after 100
+    # seconds is scheduled even if the final edit fails
+    await stream_reply(
+        llm, update.message, question, key=(update.effective_chat.id, update.effective_user.id),
+        on_done=lambda m: deletions.schedule(m, 100),
+    )
 
 # Main function
 def main():
-    app = Application.builder().token(BOT_TOKEN).build()
+    app = Application.builder().token(BOT_TOKEN).post_init(post_init).build()
 
     # Handlers
     app.add_handler(CommandHandler("start", start))
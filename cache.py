@@ -0,0 +1,139 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class Coalescer:
+    """Shares one in-flight call between concurrent callers of the same key.
+
+    The first caller starts ``fn()``; anyone asking for the same key before it
+    finishes awaits that task instead of starting another. The task is shielded,
+    so a cancelled caller does not cancel the lookup the others are waiting on.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self.started = self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.shared += 1
+        else:
+            self.started += 1
+            task = self._inflight[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+
+class TTLCache:
+    """Bounded LRU cache with a freshness TTL and a stale-while-revalidate window.
+
+    Entries younger than ``ttl`` are served as-is. Entries older than that but
+    still inside ``ttl + stale_ttl`` are served immediately while a single
+    background task refreshes them. Anything older is fetched inline, and
+    concurrent misses for one key share a single fetch.
+    ``None`` results are never stored so failed lookups are retried.
+    """
+
+    def __init__(self, name: str, ttl: float, maxsize: int = 1024, stale_ttl: float = 0):
+        self.name      = name
+        self.ttl       = ttl
+        self.stale_ttl = stale_ttl
+        self.maxsize   = maxsize
+        self._data: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self._refreshing: dict[Hashable, asyncio.Task] = {}
+        self._pending = Coalescer(name)
+        self.hits = self.stale_hits = self.misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and self._age(entry[1]) < self.ttl
+
+    def _age(self, stored_at: float) -> float:
+        return time.monotonic() - stored_at
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a fresh value without fetching; stale or missing gives ``default``."""
+        entry = self._data.get(key)
+        if entry is None or self._age(entry[1]) >= self.ttl:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._data.move_to_end(key)
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any):
+        if value is None: return
+        self._data[key] = (value, time.monotonic())
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._data.get(key)
+        if entry is not None:
+            value, stored_at = entry
+            age = self._age(stored_at)
+            if age < self.ttl:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._data.move_to_end(key)
+                self._refresh(key, fetch)
+                return value
+            self.invalidate(key)
+        self.misses += 1
+
+        async def _fetch_and_store():
+            value = await fetch()
+            self.set(key, value)
+            return value
+
+        return await self._pending.run(key, _fetch_and_store)
+
+    def _refresh(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]):
+        if key in self._refreshing: return
+
+        async def _run():
+            try:
+                self.set(key, await fetch())
+            except Exception as e:
+                logger.warning(f"[{self.name}] background refresh failed for {key}: {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(_run())
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "name":       self.name,
+            "size":       len(self._data),
+            "hits":       self.hits,
+            "stale_hits": self.stale_hits,
+            "misses":     self.misses,
+            "evictions":  self.evictions,
+            "coalesced":  self._pending.shared,
+            "hit_rate":   round((self.hits + self.stale_hits) / lookups, 3) if lookups else 0.0,
+        }
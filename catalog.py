@@ -0,0 +1,103 @@
+import os
+import logging
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING
+from pymongo.collation import Collation
+
+logger = logging.getLogger(__name__)
+
+# ──────────────────── CONFIG ────────────────────
+MONGO_MAX_POOL_SIZE          = int(os.getenv("MONGO_MAX_POOL_SIZE", 50))
+MONGO_MIN_POOL_SIZE          = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_SERVER_SELECTION_MS    = int(os.getenv("MONGO_SERVER_SELECTION_MS", 5000))
+
+# Case-insensitive exact title match served by an index instead of a $regex scan
+TITLE_COLLATION = Collation(locale="en", strength=2)
+
+# Only what build_caption, the buttons and the poster need
+CATALOG_PROJECTION = {
+    "_id": 0, "title": 1, "tmdb_id": 1, "backdrop": 1, "poster": 1,
+    "release_date": 1, "release_year": 1, "rating": 1, "vote_average": 1,
+    "genres": 1, "genre": 1, "director": 1, "overview": 1, "description": 1, "cast": 1,
+}
+
+
+class Catalog:
+    """Async access to the ``movie``, ``tv`` and ``herosection`` collections"""
+
+    def __init__(
+        self,
+        uri: str,
+        max_pool_size: int = MONGO_MAX_POOL_SIZE,
+        min_pool_size: int = MONGO_MIN_POOL_SIZE,
+        server_selection_ms: int = MONGO_SERVER_SELECTION_MS,
+    ):
+        self.uri = uri
+        self.client_options = {
+            "maxPoolSize": max_pool_size,
+            "minPoolSize": min_pool_size,
+            "serverSelectionTimeoutMS": server_selection_ms,
+        }
+        self.client = None
+        self.db = None
+        self.movies = self.tvshows = self.herosection = None
+
+    async def connect(self):
+        try:
+            self.client      = AsyncIOMotorClient(self.uri, **self.client_options)
+            self.db          = self.client.get_default_database()
+            self.movies      = self.db["movie"]
+            self.tvshows     = self.db["tv"]
+            self.herosection = self.db["herosection"]
+        except Exception as e:
+            logger.error(f"Failed to connect to database: {e}")
+            raise
+        try:
+            await self.client.admin.command("ping")
+            logger.info("Database connection established successfully")
+        except Exception as e:
+            logger.warning(f"Database not reachable yet: {e}")
+        await self.ensure_indexes()
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+    async def ensure_indexes(self):
+        try:
+            for coll in (self.movies, self.tvshows):
+                await coll.create_index([("title", ASCENDING)], name="title_ci", collation=TITLE_COLLATION)
+        except Exception as e:
+            logger.warning(f"Could not create title indexes: {e}")
+
+    def collection(self, media_type: str):
+        return self.movies if media_type == "movie" else self.tvshows
+
+    async def lookup_title(self, title: str, projection: dict = CATALOG_PROJECTION) -> tuple[dict, str] | None:
+        """Resolve a title against movies and tv in one round-trip.
+
+        Both collections are matched through their ``title_ci`` index and merged
+        with ``$unionWith``; a movie wins over a show with the same title.
+        Returns ``(doc, media_type)`` or ``None``.
+        """
+        title = (title or "").strip()
+        if not title: return None
+        match = [{"$match": {"title": title}}, {"$limit": 1}, {"$project": projection}]
+        pipeline = [
+            *match,
+            {"$addFields": {"_media_type": "movie"}},
+            {"$unionWith": {"coll": self.tvshows.name, "pipeline": [*match, {"$addFields": {"_media_type": "tv"}}]}},
+            {"$sort": {"_media_type": 1}},
+            {"$limit": 1},
+        ]
+        async for doc in self.movies.aggregate(pipeline, collation=TITLE_COLLATION):
+            return doc, doc.pop("_media_type")
+        return None
+
+    async def hero_count(self) -> int:
+        return await self.herosection.count_documents({})
+
+    async def sample_heroes(self, size: int = 1) -> list[dict]:
+        return await self.herosection.aggregate([{"$sample": {"size": size}}]).to_list(length=size)
@@ -0,0 +1,198 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from catalog import Catalog
+
+logger = logging.getLogger(__name__)
+
+# ──────────────────── CONFIG ────────────────────
+WATCH_POLL_SECONDS    = int(os.getenv("WATCH_POLL_SECONDS", 60))
+WATCH_RETRY_SECONDS   = 5
+WATCH_READY_TIMEOUT   = 30   # how long ready() waits for the stream to open
+WATCH_RECONCILE_EVERY = 10   # polls between _id sweeps that detect deletions
+UPDATED_AT_FIELD      = "updated_at"
+
+WATCHED_COLLECTIONS = ("movie", "tv", "herosection")
+
+# ChangeStreamFatalError / ChangeStreamHistoryLost: the resume token is unusable
+CHANGE_STREAM_HISTORY_LOST = (280, 286)
+
+# listener(op, doc_id, doc): op is "upsert" or "delete"; doc is None on delete
+Listener = Callable[[str, Any, dict | None], None]
+
+
+class CatalogWatcher:
+    """Pushes admin edits to ``movie``, ``tv`` and ``herosection`` into in-process state.
+
+    One change stream on the database covers all watched collections and is
+    resumed from its last token after transient errors. When the deployment
+    does not support change streams (standalone server), it falls back to
+    polling each collection for documents whose ``updated_at`` moved past the
+    last seen value, plus a periodic ``_id`` sweep to notice deletions.
+
+    To load a snapshot without losing or racing edits: ``hold()``, ``start()``,
+    ``await ready()``, load, then ``release()``. Events that arrive while held
+    are buffered and replayed in order on release.
+    """
+
+    def __init__(self, catalog: Catalog, poll_interval: float = WATCH_POLL_SECONDS):
+        self.catalog = catalog
+        self.poll_interval = poll_interval
+        self._listeners: dict[str, list[Listener]] = {name: [] for name in WATCHED_COLLECTIONS}
+        self._task: asyncio.Task | None = None
+        self._resume_token = None
+        self._live = asyncio.Event()
+        self._held: list[tuple[str, str, Any, dict | None]] | None = None
+        self.mode = "stopped"
+        self.events = self.errors = 0
+
+    def on(self, collection: str, listener: Listener):
+        self._listeners.setdefault(collection, []).append(listener)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def ready(self, timeout: float = WATCH_READY_TIMEOUT) -> bool:
+        """Wait until changes from now on are being captured (stream open or polling baseline taken)"""
+        try:
+            await asyncio.wait_for(self._live.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"Catalog watch not live after {timeout}s; edits made meanwhile may be missed")
+            return False
+
+    def hold(self):
+        """Buffer events instead of delivering them until ``release()``"""
+        if self._held is None:
+            self._held = []
+
+    def release(self):
+        held, self._held = self._held or [], None
+        for event in held:
+            self._deliver(*event)
+        if held:
+            logger.info(f"Replayed {len(held)} catalog change(s) received while held")
+
+    async def stop(self):
+        if self._task is None: return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._live.clear()
+        self.mode = "stopped"
+
+    def _emit(self, collection: str, op: str, doc_id: Any, doc: dict | None):
+        self.events += 1
+        if self._held is not None:
+            self._held.append((collection, op, doc_id, doc))
+        else:
+            self._deliver(collection, op, doc_id, doc)
+
+    def _deliver(self, collection: str, op: str, doc_id: Any, doc: dict | None):
+        for listener in self._listeners.get(collection, []):
+            try:
+                listener(op, doc_id, doc)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Listener for {collection} failed on {op} {doc_id}: {e}")
+
+    async def _run(self):
+        polling = False
+        while True:
+            try:
+                if polling:
+                    await self._poll()
+                else:
+                    await self._watch()
+            except OperationFailure as e:
+                if not polling and e.code in CHANGE_STREAM_HISTORY_LOST:
+                    logger.warning(f"Change stream resume point expired ({e}), restarting from now")
+                    self._resume_token = None
+                elif not polling:
+                    # Standalone servers reject $changeStream; nothing to retry
+                    logger.warning(f"Change streams unavailable ({e}), polling every {self.poll_interval}s instead")
+                    polling = True
+                else:
+                    self.errors += 1
+                    logger.warning(f"Catalog polling failed ({e}), restarting in {WATCH_RETRY_SECONDS}s")
+                    await asyncio.sleep(WATCH_RETRY_SECONDS)
+            except PyMongoError as e:
+                self.errors += 1
+                logger.warning(f"Catalog watch interrupted ({e}), resuming in {WATCH_RETRY_SECONDS}s")
+                await asyncio.sleep(WATCH_RETRY_SECONDS)
+
+    async def _watch(self):
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": list(self._listeners)},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+        }}]
+        async with self.catalog.db.watch(
+            pipeline, full_document="updateLookup", resume_after=self._resume_token
+        ) as stream:
+            self.mode = "change_stream"
+            # Pin the opening point so a reconnect resumes from here, not from "now"
+            self._resume_token = stream.resume_token or self._resume_token
+            self._live.set()
+            logger.info("Watching catalog change stream")
+            async for change in stream:
+                self._resume_token = stream.resume_token
+                doc_id = change["documentKey"]["_id"]
+                doc = change.get("fullDocument")
+                # An update whose document is already gone is a delete by now
+                op = "delete" if change["operationType"] == "delete" or doc is None else "upsert"
+                self._emit(change["ns"]["coll"], op, doc_id, doc)
+
+    async def _poll(self):
+        self.mode = "polling"
+        since = {name: datetime.now(timezone.utc) for name in self._listeners}
+        known = {name: await self._baseline(name) for name in self._listeners}
+        self._live.set()
+        polls = 0
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            polls += 1
+            for name in self._listeners:
+                try:
+                    coll = self.catalog.db[name]
+                    async for doc in coll.find({UPDATED_AT_FIELD: {"$gt": since[name]}}).sort(UPDATED_AT_FIELD, 1):
+                        since[name] = max(since[name], _aware(doc[UPDATED_AT_FIELD]))
+                        known[name].add(doc["_id"])
+                        self._emit(name, "upsert", doc["_id"], doc)
+                    if polls % WATCH_RECONCILE_EVERY == 0:
+                        current = await self._ids(name)
+                        for doc_id in known[name] - current:
+                            self._emit(name, "delete", doc_id, None)
+                        known[name] = current
+                except Exception as e:
+                    self.errors += 1
+                    logger.warning(f"Polling {name} failed: {e}")
+
+    async def _baseline(self, name: str) -> set:
+        # The starting _id set must exist before polling means anything; keep trying
+        while True:
+            try:
+                return await self._ids(name)
+            except PyMongoError as e:
+                self.errors += 1
+                logger.warning(f"Could not list {name} ids ({e}), retrying in {WATCH_RETRY_SECONDS}s")
+                await asyncio.sleep(WATCH_RETRY_SECONDS)
+
+    async def _ids(self, name: str) -> set:
+        return {doc["_id"] async for doc in self.catalog.db[name].find({}, {"_id": 1})}
+
+    def stats(self) -> dict:
+        return {"mode": self.mode, "events": self.events, "errors": self.errors}
+
+
+def _aware(value: datetime) -> datetime:
+    # PyMongo returns naive UTC datetimes unless the client is tz_aware
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from pymongo import ASCENDING
+
+from cache import TTLCache
+from llm import FALLBACK_REPLIES
+
+logger = logging.getLogger(__name__)
+
+# ──────────────────── CONFIG ────────────────────
+FUN_FACTS_DIR         = os.getenv("FUN_FACTS_DIR", "/tmp/fun_facts")
+FUN_FACTS_TTL         = 30 * 24 * 3600
+FUN_FACTS_MAX_ENTRIES = int(os.getenv("FUN_FACTS_MAX_ENTRIES", 5000))
+FUN_FACTS_MEMORY_SIZE = 512
+
+# Bump the version whenever the prompt changes so old answers are not reused
+FUN_FACTS_PROMPT_VERSION = "v1"
+FUN_FACTS_PROMPT         = "Give me some interesting fun facts about the movie {title} ({year})."
+
+
+class _Uncacheable(Exception):
+    """Carries a model reply that must reach the caller but not the cache"""
+
+    def __init__(self, text: str):
+        super().__init__(text)
+        self.text = text
+
+
+class FunFactsCache:
+    """Generated fun facts per (imdbID, prompt version), kept for ``ttl`` seconds.
+
+    Stored in Mongo once ``bind()`` is called, otherwise as one JSON file per
+    title under ``directory``; either store is capped at ``max_entries`` with
+    the oldest answers dropped first. A small in-memory LRU sits in front, and
+    concurrent requests for one title share a single generation. Busy/timeout
+    replies from the model are returned but never stored.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[str], Awaitable[str]],
+        ttl: float = FUN_FACTS_TTL,
+        max_entries: int = FUN_FACTS_MAX_ENTRIES,
+        directory: str = FUN_FACTS_DIR,
+    ):
+        self.generate    = generate
+        self.ttl         = ttl
+        self.max_entries = max_entries
+        self.directory   = directory
+        self.coll = None
+        self.mem  = TTLCache("fun_facts", ttl, FUN_FACTS_MEMORY_SIZE)
+        self.generated = self.stored_hits = 0
+
+    async def bind(self, coll):
+        self.coll = coll
+        try:
+            await coll.create_index([("key", ASCENDING)], name="key", unique=True)
+            await coll.create_index([("expires_at", ASCENDING)], name="expires_at", expireAfterSeconds=0)
+        except Exception as e:
+            logger.warning(f"Could not create fun facts indexes: {e}")
+
+    @staticmethod
+    def key(imdb_id: str) -> str:
+        return f"{FUN_FACTS_PROMPT_VERSION}:{imdb_id}"
+
+    # ─────────── storage ───────────
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{hashlib.sha256(key.encode()).hexdigest()}.json")
+
+    def _disk_get(self, key: str) -> str | None:
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return entry["text"] if time.time() - entry["created"] < self.ttl else None
+
+    def _disk_put(self, key: str, text: str):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "text": text, "created": time.time()}, f)
+        os.replace(tmp, path)
+        entries = sorted(
+            (e for e in os.scandir(self.directory) if e.name.endswith(".json")),
+            key=lambda e: e.stat().st_mtime,
+        )
+        for e in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(e.path)
+            except OSError:
+                pass
+
+    async def _load(self, key: str) -> str | None:
+        if self.coll is None:
+            return await asyncio.to_thread(self._disk_get, key)
+        try:
+            doc = await self.coll.find_one(
+                {"key": key, "expires_at": {"$gt": datetime.now(timezone.utc)}}, {"_id": 0, "text": 1}
+            )
+            return doc["text"] if doc else None
+        except Exception as e:
+            logger.error(f"Fun facts lookup failed for {key}: {e}")
+            return None
+
+    async def _store(self, key: str, text: str):
+        if self.coll is None:
+            await asyncio.to_thread(self._disk_put, key, text)
+            return
+        now = datetime.now(timezone.utc)
+        try:
+            await self.coll.update_one(
+                {"key": key},
+                {"$set": {"text": text, "created_at": now, "expires_at": now + timedelta(seconds=self.ttl)}},
+                upsert=True,
+            )
+            excess = await self.coll.estimated_document_count() - self.max_entries
+            if excess > 0:
+                oldest = await self.coll.find({}, {"_id": 1}).sort("created_at", ASCENDING).limit(excess).to_list(excess)
+                await self.coll.delete_many({"_id": {"$in": [d["_id"] for d in oldest]}})
+        except Exception as e:
+            logger.error(f"Fun facts store failed for {key}: {e}")
+
+    # ─────────── lookup ───────────
+    async def get(self, info: dict) -> str:
+        """Fun facts for an OMDb record; generated once per title and prompt version"""
+        prompt = FUN_FACTS_PROMPT.format(title=info.get("Title", ""), year=info.get("Year", ""))
+        imdb_id = info.get("imdbID")
+        if not imdb_id:
+            return await self.generate(prompt) or ""
+        key = self.key(imdb_id)
+
+        async def _fetch() -> str | None:
+            text = await self._load(key)
+            if text is not None:
+                self.stored_hits += 1
+                return text
+            text = await self.generate(prompt)
+            if not text or text in FALLBACK_REPLIES:
+                raise _Uncacheable(text or "")
+            self.generated += 1
+            await self._store(key, text)
+            return text
+
+        try:
+            return await self.mem.get_or_fetch(key, _fetch)
+        except _Uncacheable as e:
+            return e.text
+
+    async def warm(self, infos: list[dict]) -> int:
+        """Make sure every title in ``infos`` has facts ready; one generation at a time"""
+        warmed = 0
+        for info in infos:
+            if info.get("imdbID") and self.key(info["imdbID"]) not in self.mem:
+                await self.get(info)
+                warmed += 1
+        return warmed
@@ -0,0 +1,75 @@
+import os
+import asyncio
+import logging
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# ──────────────────── CONFIG ────────────────────
+HTTP_TIMEOUT          = float(os.getenv("HTTP_TIMEOUT", 10))
+HTTP_CONNECT_TIMEOUT  = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_MAX_CONNECTIONS  = int(os.getenv("HTTP_MAX_CONNECTIONS", 50))
+HTTP_MAX_KEEPALIVE    = int(os.getenv("HTTP_MAX_KEEPALIVE", 20))
+HTTP_PER_HOST_LIMIT   = int(os.getenv("HTTP_PER_HOST_LIMIT", 10))
+HTTP_USER_AGENT       = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+
+class HttpClient:
+    """Shared async HTTP client with keep-alive pooling and per-host limits.
+
+    One instance is opened on application start-up and closed on shutdown so
+    every TMDb/OMDb/image request reuses the same connection pool instead of
+    blocking the event loop with ``requests``.
+    """
+
+    def __init__(self, per_host_limit: int = HTTP_PER_HOST_LIMIT):
+        self.per_host_limit = per_host_limit
+        self._client: httpx.AsyncClient | None = None
+        self._host_slots: dict[str, asyncio.Semaphore] = {}
+
+    async def start(self):
+        if self._client is not None: return
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            ),
+            headers={"User-Agent": HTTP_USER_AGENT},
+            follow_redirects=True,
+        )
+        logger.info("HTTP client started")
+
+    async def close(self):
+        if self._client is None: return
+        await self._client.aclose()
+        self._client = None
+        logger.info("HTTP client closed")
+
+    def _slot(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.per_host_limit)
+        return slot
+
+    async def get(self, url: str, params: dict | None = None, **kwargs) -> httpx.Response:
+        if self._client is None:
+            await self.start()
+        async with self._slot(url):
+            resp = await self._client.get(url, params=params, **kwargs)
+        resp.raise_for_status()
+        return resp
+
+    async def get_json(self, url: str, params: dict | None = None, **kwargs) -> dict:
+        resp = await self.get(url, params=params, **kwargs)
+        return resp.json()
+
+    async def get_bytes(self, url: str, params: dict | None = None, **kwargs) -> bytes:
+        resp = await self.get(url, params=params, **kwargs)
+        return resp.content
+
+
+http = HttpClient()
@@ -0,0 +1,249 @@
+import os
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Awaitable, Callable
+
+from PIL import Image
+from pymongo import ASCENDING
+from telegram import Message
+from telegram.error import BadRequest
+
+from httpclient import http
+from cache import Coalescer, TTLCache
+
+logger = logging.getLogger(__name__)
+
+# ──────────────────── CONFIG ────────────────────
+IMAGE_CACHE_DIR       = os.getenv("IMAGE_CACHE_DIR", "/tmp/image_cache")
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+IMAGE_WORKERS         = int(os.getenv("IMAGE_WORKERS", 2))
+IMAGE_MAX_WIDTH       = 1280
+IMAGE_JPEG_QUALITY    = 85
+
+# In-memory front of the file_id store; Telegram file_ids do not expire
+FILE_ID_MEMORY_SIZE   = int(os.getenv("FILE_ID_MEMORY_SIZE", 4096))
+FILE_ID_MEMORY_TTL    = 7 * 24 * 3600
+
+# BadRequest texts meaning the cached file_id itself is unusable
+STALE_FILE_ID_ERRORS = ("wrong file identifier", "wrong remote file", "wrong padding")
+
+# Crop variants used as part of the file_id and disk cache keys
+VARIANT_16_9     = "16x9"
+VARIANT_ORIGINAL = "original"
+
+
+def render_image(data: bytes, variant: str) -> bytes:
+    """Decode, optionally crop to 16:9, bound the width and encode as JPEG.
+
+    CPU-bound; runs in the image worker pool, never on the event loop.
+    """
+    img = Image.open(BytesIO(data))
+    img.draft("RGB", (IMAGE_MAX_WIDTH, IMAGE_MAX_WIDTH))   # JPEG: decode at reduced scale
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if variant == VARIANT_16_9:
+        w, h = img.size; nh = int(w * 9 / 16)
+        if h > nh:
+            top = (h-nh)//2
+            img = img.crop((0,top,w,top+nh))
+    if img.width > IMAGE_MAX_WIDTH:
+        img = img.resize((IMAGE_MAX_WIDTH, round(img.height * IMAGE_MAX_WIDTH / img.width)), Image.LANCZOS)
+    buf = BytesIO()
+    img.save(buf, "JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+    return buf.getvalue()
+
+
+class DiskCache:
+    """Content-addressed cache of rendered images with size-based LRU eviction.
+
+    File names are the SHA-256 of (URL, transform); mtime is bumped on every
+    read so eviction drops the least recently used files first.
+    """
+
+    def __init__(self, directory: str = IMAGE_CACHE_DIR, max_bytes: int = IMAGE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(e.stat().st_size for e in self._files())
+        self._lock = threading.Lock()   # size bookkeeping; put() runs on pool threads
+
+    @staticmethod
+    def key(url: str, variant: str) -> str:
+        transform = f"{variant}:w{IMAGE_MAX_WIDTH}:q{IMAGE_JPEG_QUALITY}"
+        return hashlib.sha256(f"{url}|{transform}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.jpg")
+
+    def get(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        # Unique temp name per writer, so concurrent renders of one key never share a file
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False) as f:
+            f.write(data)
+        with self._lock:
+            try:
+                old = os.stat(path).st_size
+            except FileNotFoundError:
+                old = 0
+            os.replace(f.name, path)
+            self._size += len(data) - old
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _files(self):
+        # Finished entries only; temp files still being written are not ours to count or evict
+        return (e for e in os.scandir(self.directory) if e.is_file() and e.name.endswith(".jpg"))
+
+    def _evict(self):
+        entries = sorted(
+            self._files(),
+            key=lambda e: e.stat().st_mtime,
+        )
+        self._size = sum(e.stat().st_size for e in entries)
+        target = self.max_bytes * 0.9
+        for e in entries:
+            if self._size <= target: break
+            try:
+                size = e.stat().st_size
+                os.remove(e.path)
+                self._size -= size
+            except OSError:
+                pass
+
+
+class ImagePipeline:
+    """Downloads and renders images in a worker pool behind a disk cache"""
+
+    def __init__(self, disk: DiskCache | None = None, workers: int = IMAGE_WORKERS):
+        self.disk = disk or DiskCache()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image")
+        self.inflight = Coalescer("image")
+        self.disk_hits = self.renders = 0
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+
+    async def prepare(self, url: str, variant: str) -> BytesIO | None:
+        """Rendered image as a fresh stream; concurrent calls share one download"""
+        if not url or url in ["N/A", ""]: return None
+        data = await self.inflight.run((url, variant), lambda: self._prepare(url, variant))
+        return BytesIO(data) if data is not None else None
+
+    async def _prepare(self, url: str, variant: str) -> bytes | None:
+        try:
+            key = self.disk.key(url, variant)
+            data = await self._run(self.disk.get, key)
+            if data is not None:
+                self.disk_hits += 1
+                return data
+            raw = await http.get_bytes(url)
+            data = await self._run(render_image, raw, variant)
+            self.renders += 1
+            await self._run(self.disk.put, key, data)
+            return data
+        except Exception as e:
+            logger.error(f"Image prepare failed for URL {url}: {e}")
+            return None
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+
+class PhotoCache:
+    """Maps (image URL, variant) to the Telegram ``file_id`` of its first upload.
+
+    Backed by a Mongo collection so ids survive restarts, with a bounded
+    in-memory LRU in front so repeat sends cost no database round-trip either.
+    """
+
+    def __init__(self):
+        self.coll = None
+        self._mem = TTLCache("file_ids", FILE_ID_MEMORY_TTL, FILE_ID_MEMORY_SIZE)
+        self.uploads = self.reuses = 0
+
+    async def bind(self, coll):
+        self.coll = coll
+        try:
+            await coll.create_index([("url", ASCENDING), ("variant", ASCENDING)], name="url_variant", unique=True)
+        except Exception as e:
+            logger.warning(f"Could not create file_id index: {e}")
+
+    async def get(self, url: str, variant: str) -> str | None:
+        key = (url, variant)
+        file_id = self._mem.get(key)
+        if file_id is not None: return file_id
+        if self.coll is None: return None
+        try:
+            doc = await self.coll.find_one({"url": url, "variant": variant}, {"_id": 0, "file_id": 1})
+        except Exception as e:
+            logger.error(f"file_id lookup failed for {url}: {e}")
+            return None
+        if doc:
+            self._mem.set(key, doc["file_id"])
+            return doc["file_id"]
+        return None
+
+    async def put(self, url: str, variant: str, file_id: str):
+        self._mem.set((url, variant), file_id)
+        if self.coll is None: return
+        try:
+            await self.coll.update_one(
+                {"url": url, "variant": variant}, {"$set": {"file_id": file_id}}, upsert=True
+            )
+        except Exception as e:
+            logger.error(f"file_id store failed for {url}: {e}")
+
+    async def forget(self, url: str, variant: str):
+        self._mem.invalidate((url, variant))
+        if self.coll is None: return
+        try:
+            await self.coll.delete_one({"url": url, "variant": variant})
+        except Exception as e:
+            logger.error(f"file_id delete failed for {url}: {e}")
+
+    async def send(
+        self,
+        url: str | None,
+        variant: str,
+        load: Callable[[str], Awaitable[BytesIO | None]],
+        send: Callable[[str | BytesIO], Awaitable[Message]],
+    ) -> Message | None:
+        """Send ``url`` through ``send``, reusing a cached ``file_id`` when there is one.
+
+        ``load`` produces the image bytes for the first upload only. Returns
+        ``None`` when there is no usable image so the caller can fall back to text.
+        """
+        if not url or url == "N/A": return None
+        file_id = await self.get(url, variant)
+        if file_id:
+            try:
+                msg = await send(file_id)
+                self.reuses += 1
+                return msg
+            except BadRequest as e:
+                # Caption too long, bad HTML etc. would fail on re-upload too
+                if not any(m in str(e).casefold() for m in STALE_FILE_ID_ERRORS): raise
+                logger.warning(f"Cached file_id rejected for {url}, re-uploading: {e}")
+                await self.forget(url, variant)
+        data = await load(url)
+        if data is None: return None
+        msg = await send(data)
+        self.uploads += 1
+        if msg and msg.photo:
+            await self.put(url, variant, msg.photo[-1].file_id)
+        return msg
@@ -0,0 +1,237 @@
+import os
+import time
+import asyncio
+import logging
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable
+
+import google.generativeai as genai
+from telegram import Message
+from telegram.error import BadRequest, RetryAfter, TelegramError
+
+logger = logging.getLogger(__name__)
+
+# ──────────────────── CONFIG ────────────────────
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 4))
+LLM_MAX_QUEUE   = int(os.getenv("LLM_MAX_QUEUE", 16))
+LLM_TIMEOUT     = float(os.getenv("LLM_TIMEOUT", 20))
+
+# Streamed replies: placeholder first, then an edit at most every interval
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", 1.5))
+STREAM_PLACEHOLDER   = "💭 Thinking…"
+TELEGRAM_TEXT_LIMIT  = 4096
+
+BUSY_REPLY    = "🤖 The AI is busy right now, please try again in a moment."
+TIMEOUT_REPLY = "⌛ The AI took too long to answer, please try again."
+ERROR_REPLY   = "Error generating AI response."
+EMPTY_REPLY   = "No response generated."
+
+# Stand-in replies that say nothing about the prompt; callers must not cache them
+FALLBACK_REPLIES = {BUSY_REPLY, TIMEOUT_REPLY, ERROR_REPLY, EMPTY_REPLY}
+
+
+class LLMBusy(Exception):
+    """Raised instead of queueing when ``max_queue`` calls are already waiting"""
+
+
+class LLMSuperseded(Exception):
+    """Raised into a stream once a newer call with the same key has started"""
+
+
+class LLMClient:
+    """Async Gemini calls with bounded concurrency, deadlines and backpressure.
+
+    At most ``concurrency`` generations run at once; up to ``max_queue`` more
+    wait for a slot and anything beyond that is refused with ``LLMBusy``
+    instead of piling up. ``timeout`` is a deadline covering the wait and the
+    generation. Streams started with a ``key`` (e.g. chat and user) supersede
+    the caller's previous stream still in flight, which stops at its next chunk.
+    """
+
+    def __init__(
+        self,
+        model: genai.GenerativeModel,
+        concurrency: int = LLM_CONCURRENCY,
+        max_queue: int = LLM_MAX_QUEUE,
+        timeout: float = LLM_TIMEOUT,
+    ):
+        self.model     = model
+        self.timeout   = timeout
+        self.max_queue = max_queue
+        self._slots    = asyncio.Semaphore(concurrency)
+        self._waiting  = 0
+        self._by_key: dict[Hashable, object] = {}   # key → token of the live stream
+        self.calls = self.rejected = self.timeouts = self.cancelled = self.failures = 0
+
+    def cancel(self, key: Hashable) -> bool:
+        """Stop the stream registered under ``key``; it notices at its next chunk"""
+        return self._by_key.pop(key, None) is not None
+
+    async def _generate(self, prompt: str, timeout: float) -> str:
+        await self._acquire(timeout)
+        try:
+            started = time.perf_counter()
+            response = await self.model.generate_content_async(prompt, request_options={"timeout": timeout})
+            logger.debug(f"Generated {len(prompt)}-char prompt in {(time.perf_counter() - started) * 1000:.0f} ms")
+            return response.text if response else EMPTY_REPLY
+        finally:
+            self._slots.release()
+
+    async def _acquire(self, timeout: float):
+        if not self._slots.locked():
+            await self._slots.acquire()   # free slot: no wait, not queued
+            return
+        if self._waiting >= self.max_queue:
+            self.rejected += 1
+            raise LLMBusy()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        finally:
+            self._waiting -= 1
+
+    async def stream(self, prompt: str, key: Hashable | None = None, timeout: float | None = None) -> AsyncIterator[str]:
+        """Yield generated text piece by piece under the same limits as ``generate``.
+
+        Raises ``LLMBusy``, ``asyncio.TimeoutError`` once the deadline passes,
+        or ``LLMSuperseded`` when a newer call with the same ``key`` started.
+        """
+        deadline = time.monotonic() + (timeout or self.timeout)
+        remaining = lambda: max(0.0, deadline - time.monotonic())
+        token = object()
+        self.calls += 1
+        if key is not None:
+            self.cancel(key)
+            self._by_key[key] = token
+        try:
+            await self._acquire(remaining())
+            try:
+                response = await asyncio.wait_for(
+                    self.model.generate_content_async(prompt, stream=True, request_options={"timeout": remaining()}),
+                    remaining(),
+                )
+                chunks = response.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), remaining())
+                    except StopAsyncIteration:
+                        return
+                    if key is not None and self._by_key.get(key) is not token:
+                        self.cancelled += 1
+                        raise LLMSuperseded()
+                    yield chunk.text
+            finally:
+                self._slots.release()
+        finally:
+            if key is not None and self._by_key.get(key) is token:
+                del self._by_key[key]
+
+    async def generate(self, prompt: str, timeout: float | None = None) -> str:
+        """Generated text, or a short user-facing reply when busy, late or failing"""
+        timeout = timeout or self.timeout
+        self.calls += 1
+        try:
+            return await asyncio.wait_for(self._generate(prompt, timeout), timeout)
+        except LLMBusy:
+            return BUSY_REPLY
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.warning(f"AI generation timed out after {timeout}s")
+            return TIMEOUT_REPLY
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Error generating AI response: {e}")
+            return ERROR_REPLY
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls, "waiting": self._waiting, "rejected": self.rejected,
+            "timeouts": self.timeouts, "cancelled": self.cancelled, "failures": self.failures,
+        }
+
+
+async def stream_reply(
+    llm: LLMClient,
+    message: Message,
+    prompt: str,
+    key: Hashable | None = None,
+    on_done: Callable[[Message], Awaitable[Any]] | None = None,
+) -> Message | None:
+    """Answer ``message`` with a placeholder that is edited as text streams in.
+
+    Edits are throttled to one per ``STREAM_EDIT_INTERVAL`` (longer after a
+    flood wait). ``on_done`` (e.g. scheduling deletion) always runs on the
+    placeholder unless it was already deleted, even when editing fails.
+    Returns the final message, or ``None`` after deleting the placeholder
+    when a newer request with the same ``key`` took over.
+    """
+    reply = await message.reply_text(STREAM_PLACEHOLDER)
+    text, shown, next_edit = "", STREAM_PLACEHOLDER, 0.0
+    deleted = False
+
+    async def show(body: str):
+        nonlocal shown, next_edit
+        body = body if len(body) <= TELEGRAM_TEXT_LIMIT else body[:TELEGRAM_TEXT_LIMIT - 1] + "…"
+        if body == shown: return
+        try:
+            await reply.edit_text(body)
+            shown = body
+            next_edit = time.monotonic() + STREAM_EDIT_INTERVAL
+        except RetryAfter as e:
+            next_edit = time.monotonic() + float(e.retry_after)
+        except BadRequest as e:
+            if "not modified" not in str(e): raise
+
+    async def show_final(body: str):
+        # The last edit must land; intermediate ones can be skipped
+        for attempt in range(2):
+            try:
+                await reply.edit_text(body if len(body) <= TELEGRAM_TEXT_LIMIT else body[:TELEGRAM_TEXT_LIMIT - 1] + "…")
+                return
+            except RetryAfter as e:
+                if attempt: raise
+                await asyncio.sleep(float(e.retry_after))
+            except BadRequest as e:
+                if "not modified" in str(e): return
+                raise
+
+    try:
+        try:
+            async with aclosing(llm.stream(prompt, key)) as pieces:
+                async for piece in pieces:
+                    text += piece
+                    if text.strip() and time.monotonic() >= next_edit:
+                        try:
+                            await show(text)
+                        except TelegramError as e:
+                            # A failed progress edit is Telegram's problem, not the model's
+                            logger.warning(f"Streaming edit failed, skipping it: {e}")
+        except LLMSuperseded:
+            try:
+                await reply.delete()
+                deleted = True
+            except Exception: pass
+            return None
+        except LLMBusy:
+            text = BUSY_REPLY
+        except asyncio.TimeoutError:
+            llm.timeouts += 1
+            logger.warning(f"AI stream timed out after {llm.timeout}s")
+            text = text + "…" if text.strip() else TIMEOUT_REPLY
+        except Exception as e:
+            llm.failures += 1
+            logger.error(f"Error streaming AI response: {e}")
+            text = text if text.strip() else ERROR_REPLY
+        final = text.strip() or EMPTY_REPLY
+        if final != shown:
+            try:
+                await show_final(final)
+            except Exception as e:
+                logger.error(f"Could not deliver the final AI reply: {e}")
+        return reply
+    finally:
+        if on_done is not None and not deleted:
+            try:
+                await on_done(reply)
+            except Exception as e:
+                logger.error(f"stream_reply on_done failed: {e}")
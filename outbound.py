@@ -0,0 +1,307 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Coroutine
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# ──────────────────── CONFIG ────────────────────
+# Telegram allows ~30 messages/s overall, ~20 messages/min into one group
+# and about one message/s into a private chat
+TG_GLOBAL_RATE        = float(os.getenv("TG_GLOBAL_RATE", 25))
+TG_PER_CHAT_RATE      = float(os.getenv("TG_PER_CHAT_RATE", 20 / 60))
+TG_PRIVATE_CHAT_RATE  = 1.0
+TG_PER_CHAT_BURST     = 3
+CHAT_BUCKET_SWEEP_SIZE = 1024   # idle per-chat buckets are dropped once this many exist
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", 20))
+BROADCAST_MAX_RETRIES = 3
+
+# Priority lanes for outbound Bot API calls, lowest value is served first
+LANE_INTERACTIVE = 0
+LANE_BROADCAST   = 1
+LANE_CLEANUP     = 2
+LANE_NAMES       = {LANE_INTERACTIVE: "interactive", LANE_BROADCAST: "broadcast", LANE_CLEANUP: "cleanup"}
+
+CLEANUP_ENDPOINTS = {"deleteMessage", "deleteMessages"}
+
+_current_lane: ContextVar[int | None] = ContextVar("tg_lane", default=None)
+
+
+@contextmanager
+def lane(value: int):
+    """Route every Bot API call made inside the block (and tasks it spawns) to ``value``"""
+    token = _current_lane.set(value)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+def _is_chat_limited(endpoint: str) -> bool:
+    return endpoint.startswith(("send", "edit", "copy", "forward"))
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, up to ``capacity``"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate     = rate
+        self.capacity = capacity
+        self.tokens   = capacity
+        self.updated  = time.monotonic()
+        self._lock    = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Take ``tokens`` if available and return 0, else return the wait in seconds"""
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+    async def acquire(self, tokens: float = 1):
+        async with self._lock:
+            while (wait := self.try_acquire(tokens)) > 0:
+                await asyncio.sleep(wait)
+
+
+@dataclass
+class Delivery:
+    chat_id: int
+    ok: bool = False
+    result: Any = None
+    error: str | None = None
+    attempts: int = 0
+    elapsed_ms: float = 0.0
+
+
+@dataclass
+class BroadcastReport:
+    deliveries: list[Delivery] = field(default_factory=list)
+
+    @property
+    def sent(self) -> int:
+        return sum(d.ok for d in self.deliveries)
+
+    @property
+    def failed(self) -> list[Delivery]:
+        return [d for d in self.deliveries if not d.ok]
+
+    def summary(self) -> str:
+        times = sorted(d.elapsed_ms for d in self.deliveries if d.ok)
+        if not times:
+            return f"0/{len(self.deliveries)} delivered"
+        p50 = times[len(times) // 2]
+        return f"{self.sent}/{len(self.deliveries)} delivered, p50 {p50:.0f} ms, max {times[-1]:.0f} ms"
+
+
+class Broadcaster:
+    """Concurrent fan-out of one message to many chats within Telegram's limits.
+
+    Sends run in the broadcast lane of ``PriorityRateLimiter``, which applies
+    the per-chat and global token buckets. A ``RetryAfter`` only puts the
+    affected chat to sleep; the other chats keep going. The fan-out waits for
+    the first attempt on each of the first ``warmup`` chats, so a photo is
+    uploaded once and the rest reuse its ``file_id``; their retries, if any,
+    run alongside the fan-out.
+    """
+
+    def __init__(self, concurrency: int = BROADCAST_CONCURRENCY, max_retries: int = BROADCAST_MAX_RETRIES):
+        self.max_retries = max_retries
+        self._slots      = asyncio.Semaphore(concurrency)
+
+    async def _deliver(
+        self, chat_id: int, send: Callable[[int], Awaitable[Any]], attempted: asyncio.Event | None = None
+    ) -> Delivery:
+        d = Delivery(chat_id)
+        started = time.perf_counter()
+        while True:
+            d.attempts += 1
+            retry_in = 0.0
+            async with self._slots:
+                try:
+                    d.result = await send(chat_id)
+                    d.ok, d.error = True, None
+                    break
+                except RetryAfter as e:
+                    retry_in = float(e.retry_after)
+                    d.error = f"flood wait {retry_in:.0f}s"
+                except TimedOut as e:
+                    # The message may have gone through; retrying could duplicate it
+                    d.error = f"timed out: {e}"
+                    break
+                except (BadRequest, Forbidden) as e:
+                    # Permanent (chat not found, bot kicked, bad caption); both subclass NetworkError
+                    d.error = str(e)
+                    break
+                except NetworkError as e:
+                    retry_in = float(d.attempts)
+                    d.error = str(e)
+                except Exception as e:
+                    d.error = str(e)
+                    break
+            if attempted is not None:
+                attempted.set()
+            if d.attempts > self.max_retries: break
+            # Sleep outside the slot so other chats are not held up
+            logger.warning(f"Send to {chat_id} failed ({d.error}), retrying in {retry_in:.0f}s")
+            await asyncio.sleep(retry_in)
+        d.elapsed_ms = (time.perf_counter() - started) * 1000
+        if not d.ok:
+            logger.error(f"Send to {chat_id} failed after {d.attempts} attempt(s): {d.error}")
+        return d
+
+    async def send(self, chat_ids: list[int], send: Callable[[int], Awaitable[Any]], warmup: int = 1) -> BroadcastReport:
+        report = BroadcastReport()
+        with lane(LANE_BROADCAST):
+            first = []
+            for cid in chat_ids[:warmup]:
+                attempted = asyncio.Event()
+                task = asyncio.ensure_future(self._deliver(cid, send, attempted))
+                # Only the first attempt is waited for; a flood wait must not hold up everyone else
+                waiter = asyncio.ensure_future(attempted.wait())
+                await asyncio.wait([task, waiter], return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                first.append(task)
+            report.deliveries += await asyncio.gather(*first, *(self._deliver(cid, send) for cid in chat_ids[warmup:]))
+        for d in report.deliveries:
+            logger.debug(f"Delivered to {d.chat_id}: ok={d.ok} attempts={d.attempts} {d.elapsed_ms:.0f} ms")
+        return report
+
+
+class PriorityRateLimiter(BaseRateLimiter[dict]):
+    """Outbound scheduler for every Bot API call, plugged into PTB as its rate limiter.
+
+    Each call first waits on its chat's token bucket (sends and edits only),
+    then queues for a token from the global bucket. Global tokens go to the
+    waiting call with the best lane: interactive > broadcast > cleanup, FIFO
+    within a lane. Calls pick their lane from ``rate_limit_args={"lane": ...}``,
+    else deletions are cleanup, else the ``lane()`` context, else interactive.
+
+    On ``RetryAfter`` broadcast calls re-raise so ``Broadcaster`` can reschedule
+    just that chat; other lanes wait the advised time and retry once here.
+    """
+
+    def __init__(self, global_rate: float = TG_GLOBAL_RATE, per_chat_rate: float = TG_PER_CHAT_RATE):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.per_chat_rate = per_chat_rate
+        self._chat_buckets: dict[int | str, TokenBucket] = {}
+        self._sweep_at = CHAT_BUCKET_SWEEP_SIZE
+        self._waiting: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._wakeup: asyncio.Event | None = None
+        self._dispatcher: asyncio.Task | None = None
+        self.calls = {name: 0 for name in LANE_NAMES.values()}
+        self.wait_ms = {name: 0.0 for name in LANE_NAMES.values()}
+
+    async def initialize(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is None: return
+        self._dispatcher.cancel()
+        try:
+            await self._dispatcher
+        except asyncio.CancelledError:
+            pass
+        self._dispatcher = None
+
+    def _chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= self._sweep_at:
+                self._sweep_chat_buckets()
+            private = isinstance(chat_id, int) and chat_id > 0
+            rate = TG_PRIVATE_CHAT_RATE if private else self.per_chat_rate
+            bucket = self._chat_buckets[chat_id] = TokenBucket(rate, TG_PER_CHAT_BURST)
+        return bucket
+
+    def _sweep_chat_buckets(self):
+        # A bucket that has refilled to capacity behaves exactly like a new one
+        for chat_id, bucket in list(self._chat_buckets.items()):
+            bucket._refill()
+            if bucket.tokens >= bucket.capacity and not bucket._lock.locked():
+                del self._chat_buckets[chat_id]
+        # Sweep again only after the live set doubles, so the cost stays amortized
+        self._sweep_at = max(CHAT_BUCKET_SWEEP_SIZE, 2 * len(self._chat_buckets))
+
+    async def _dispatch(self):
+        while True:
+            if not self._waiting:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            await self.global_bucket.acquire()
+            while self._waiting:
+                _, _, fut = heapq.heappop(self._waiting)
+                if not fut.done():
+                    fut.set_result(None)
+                    break
+            else:
+                self.global_bucket.tokens += 1   # every waiter gave up; return the token
+
+    async def _global_token(self, lane_: int):
+        if self._dispatcher is None:   # not initialized (e.g. during tests); no throttling
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (lane_, next(self._seq), fut))
+        self._wakeup.set()
+        await fut
+
+    def _lane_for(self, endpoint: str, rate_limit_args: dict | None) -> int:
+        if rate_limit_args and "lane" in rate_limit_args:
+            return rate_limit_args["lane"]
+        if endpoint in CLEANUP_ENDPOINTS:
+            return LANE_CLEANUP
+        current = _current_lane.get()
+        return LANE_INTERACTIVE if current is None else current
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, bool | dict | list[dict]]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: dict | None,
+    ) -> bool | dict | list[dict]:
+        lane_ = self._lane_for(endpoint, rate_limit_args)
+        name = LANE_NAMES.get(lane_, str(lane_))
+        chat_id = data.get("chat_id")
+        attempts = 0
+        while True:
+            attempts += 1
+            started = time.perf_counter()
+            if chat_id is not None and _is_chat_limited(endpoint):
+                await self._chat_bucket(chat_id).acquire()
+            await self._global_token(lane_)
+            self.calls[name] = self.calls.get(name, 0) + 1
+            self.wait_ms[name] = self.wait_ms.get(name, 0.0) + (time.perf_counter() - started) * 1000
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if lane_ == LANE_BROADCAST or attempts > 1:
+                    raise
+                logger.warning(f"{endpoint} to {chat_id} hit flood control, retrying in {e.retry_after}s")
+                await asyncio.sleep(float(e.retry_after))
+
+    def stats(self) -> dict:
+        return {
+            name: {"calls": n, "avg_wait_ms": round(self.wait_ms.get(name, 0.0) / n, 1) if n else 0.0}
+            for name, n in self.calls.items()
+        } | {"queued": len(self._waiting)}
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """Keeps up to ``depth`` items built ahead of time by a background task.
+
+    ``build`` is awaited repeatedly until the buffer is full; ``next()`` hands
+    out a ready item at once and only builds inline when the buffer is empty
+    (e.g. right after start-up or after repeated build failures).
+
+    ``flush()`` bumps a generation counter; anything built under an older
+    generation, including a build in progress at the time, is thrown away.
+    """
+
+    def __init__(self, name: str, build: Callable[[], Awaitable[Any]], depth: int = 2, retry_delay: float = 30):
+        self.name        = name
+        self.build       = build
+        self.retry_delay = retry_delay
+        self._ready: asyncio.Queue = asyncio.Queue(maxsize=depth)
+        self._task: asyncio.Task | None = None
+        self.generation = 0
+        self.prefetched = self.inline = self.stale = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._fill())
+
+    async def stop(self):
+        if self._task is None: return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _build(self) -> Any:
+        try:
+            return await self.build()
+        except Exception as e:
+            logger.error(f"[{self.name}] build failed: {e}")
+            return None
+
+    async def _fill(self):
+        while True:
+            generation = self.generation
+            item = await self._build()
+            if generation != self.generation:
+                self.stale += 1
+                continue
+            if item is None:
+                await asyncio.sleep(self.retry_delay)
+                continue
+            # Waits while the buffer is full; a flush meanwhile makes next() drop it
+            await self._ready.put((generation, item))
+
+    def flush(self) -> int:
+        """Drop every ready or in-progress item, e.g. after the data they were built from changed"""
+        self.generation += 1
+        dropped = 0
+        while not self._ready.empty():
+            self._ready.get_nowait()
+            dropped += 1
+        return dropped
+
+    async def next(self) -> Any:
+        while not self._ready.empty():
+            generation, item = self._ready.get_nowait()
+            if generation == self.generation:
+                self.prefetched += 1
+                return item
+            self.stale += 1
+        self.inline += 1
+        return await self._build()
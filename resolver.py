@@ -0,0 +1,322 @@
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+
+from httpclient import http
+from cache import Coalescer, TTLCache
+from catalog import Catalog
+from titleindex import TitleIndex
+
+logger = logging.getLogger(__name__)
+
+# ──────────────────── CONFIG ────────────────────
+TMDB_API_BASE       = "https://api.themoviedb.org/3"
+OMDB_API_BASE       = "http://www.omdbapi.com/"
+TMDB_IMAGE_BASE     = "https://image.tmdb.org/t/p"
+TMDB_APPEND         = "credits,videos,watch/providers"
+
+# Metadata cache TTLs in seconds (fresh, then served stale while refreshing)
+TMDB_CACHE_TTL      = 6 * 3600
+OMDB_CACHE_TTL      = 24 * 3600
+METADATA_STALE_TTL  = 7 * 24 * 3600
+METADATA_CACHE_SIZE = 2048
+
+# Queries that resolved to nothing are answered from memory for a short while
+NEGATIVE_CACHE_TTL  = 10 * 60
+NEGATIVE_CACHE_SIZE = 4096
+
+
+def normalize_query(text: str) -> str:
+    return " ".join((text or "").split()).casefold()
+
+
+def get_trailer(details: dict | None) -> str | None:
+    try:
+        for v in ((details or {}).get("videos") or {}).get("results", []):
+            if v["site"].lower() == "youtube" and v["type"].lower() == "trailer":
+                return f"https://www.youtube.com/watch?v={v['key']}"
+    except Exception as e:
+        logger.error(f"Error extracting trailer: {e}")
+    return None
+
+
+def get_platforms(details: dict | None, region: str) -> list[str]:
+    try:
+        data = ((details or {}).get("watch/providers") or {}).get("results", {}).get(region, {})
+        return [p["provider_name"] for p in data.get("flatrate", [])]
+    except Exception as e:
+        logger.error(f"Error extracting platforms: {e}")
+    return []
+
+
+def _tmdb_title_matches(item: dict, query: str) -> bool:
+    q = query.casefold()
+    return any(
+        (item.get(k) or "").casefold() == q
+        for k in ("title", "original_title", "name", "original_name")
+    )
+
+
+class UpstreamUnavailable(Exception):
+    """An upstream tier failed (error, timeout, quota) rather than finding nothing"""
+
+
+@dataclass
+class ResolvedMedia:
+    """Everything a handler needs to render one title card"""
+    info: dict
+    media_type: str = "movie"
+    tmdb_id: int | None = None
+    trailer: str | None = None
+    platforms: list[str] = field(default_factory=list)
+    poster: str | None = None
+    link: str = ""
+    source: str = ""                  # catalog | omdb | tmdb | hero
+    timings: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def title(self) -> str:
+        return self.info.get("title") or self.info.get("Title", "")
+
+
+class _Timer:
+    def __init__(self, timings: dict[str, float], tier: str):
+        self.timings, self.tier = timings, tier
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.timings[self.tier] = round((time.perf_counter() - self.t0) * 1000, 1)
+
+
+class MediaResolver:
+    """Tiered title lookup shared by search, broadcast and auto-post.
+
+    Tiers run in order: local catalog (exact title, then the fuzzy title index
+    when one is given), OMDb, then TMDb search. Whichever hits
+    is enriched with a single TMDb details call (trailer + platforms) and a
+    frontend link. Upstream metadata goes through TTL caches, and per-tier
+    timings in milliseconds are recorded on the result.
+    """
+
+    def __init__(
+        self,
+        catalog: Catalog,
+        tmdb_api_key: str,
+        omdb_api_key: str,
+        frontend_url: str,
+        region: str = "IN",
+        index: TitleIndex | None = None,
+    ):
+        self.catalog      = catalog
+        self.tmdb_api_key = tmdb_api_key
+        self.omdb_api_key = omdb_api_key
+        self.frontend_url = frontend_url
+        self.region       = region
+        self.index        = index
+        self.tmdb_cache   = TTLCache("tmdb", TMDB_CACHE_TTL, METADATA_CACHE_SIZE, METADATA_STALE_TTL)
+        self.omdb_cache   = TTLCache("omdb", OMDB_CACHE_TTL, METADATA_CACHE_SIZE, METADATA_STALE_TTL)
+        self.negative     = TTLCache("negative", NEGATIVE_CACHE_TTL, NEGATIVE_CACHE_SIZE)
+        self.inflight     = Coalescer("resolve")
+
+    @property
+    def caches(self) -> list[TTLCache]:
+        return [self.tmdb_cache, self.omdb_cache, self.negative]
+
+    # ─────────── upstream APIs ───────────
+    async def tmdb_get(self, path: str, **params) -> dict:
+        return await http.get_json(f"{TMDB_API_BASE}{path}", params={"api_key": self.tmdb_api_key, **params})
+
+    async def omdb_get(self, **params) -> dict:
+        return await http.get_json(OMDB_API_BASE, params={"apikey": self.omdb_api_key, **params})
+
+    async def get_omdb(self, query: str, strict: bool = False) -> dict:
+        """OMDb ``?t=`` lookup; only successful responses are cached.
+
+        With ``strict`` a failed call (as opposed to "not found") raises
+        ``UpstreamUnavailable`` instead of reading as a miss.
+        """
+        async def _fetch():
+            try:
+                data = await self.omdb_get(t=query)
+            except Exception as e:
+                raise UpstreamUnavailable(f"OMDb lookup failed for {query}: {e}") from e
+            if data.get("Response") == "True":
+                return data
+            # "Movie not found!" is a miss; quota and key errors are failures
+            if "not found" not in (data.get("Error") or "").casefold():
+                raise UpstreamUnavailable(f"OMDb refused {query}: {data.get('Error')}")
+            return None
+
+        key = ("omdb", normalize_query(query), None, None)
+        try:
+            return await self.omdb_cache.get_or_fetch(key, _fetch) or {"Response": "False"}
+        except UpstreamUnavailable as e:
+            logger.error(str(e))
+            if strict: raise
+            return {"Response": "False"}
+
+    async def get_tmdb_details(self, tmdb_id: int, media_type: str = "movie") -> dict | None:
+        """Details, credits, videos and watch providers in a single TMDb round-trip"""
+        async def _fetch():
+            try:
+                return await self.tmdb_get(f"/{media_type}/{tmdb_id}", append_to_response=TMDB_APPEND)
+            except Exception as e:
+                logger.error(f"Error fetching details for TMDB ID {tmdb_id}: {e}")
+                return None
+
+        if not tmdb_id: return None
+        return await self.tmdb_cache.get_or_fetch(("tmdb", tmdb_id, media_type, self.region), _fetch)
+
+    async def search_tmdb(self, query: str, strict: bool = False) -> tuple[str, dict] | None:
+        """Search movies and TV concurrently and pick one hit.
+
+        Preference is deterministic: an exact (case-insensitive) title match
+        wins over a partial one, and on a tie the movie result wins over TV.
+        With ``strict``, finding nothing while either search failed raises
+        ``UpstreamUnavailable``.
+        """
+        failed = []
+
+        async def _search(media_type: str) -> list[dict]:
+            async def _fetch():
+                return (await self.tmdb_get(f"/search/{media_type}", query=query)).get("results") or None
+
+            key = ("tmdb_search", normalize_query(query), media_type, None)
+            try:
+                return await self.tmdb_cache.get_or_fetch(key, _fetch) or []
+            except Exception as e:
+                logger.error(f"TMDb {media_type} search failed for {query}: {e}")
+                failed.append(media_type)
+                return []
+
+        movie_res, tv_res = await asyncio.gather(_search("movie"), _search("tv"))
+        if strict and failed and not (movie_res or tv_res):
+            raise UpstreamUnavailable(f"TMDb {'/'.join(failed)} search failed for {query}")
+        candidates = [(mt, res[0]) for mt, res in (("movie", movie_res), ("tv", tv_res)) if res]
+        if not candidates: return None
+        for mt, item in candidates:
+            if _tmdb_title_matches(item, query):
+                return mt, item
+        return candidates[0]
+
+    # ─────────── links ───────────
+    def media_link_for(self, tmdb_id, media_type: str) -> str:
+        if not tmdb_id: return self.frontend_url
+        return f"{self.frontend_url}/{'mov' if media_type == 'movie' else 'ser'}/{tmdb_id}"
+
+    async def get_media_link(self, title: str, hit: tuple[dict, str] | None = None, query: str | None = None) -> str:
+        """Frontend link for a title.
+
+        ``hit``/``query`` are the caller's earlier ``lookup_title`` result and the
+        text it looked up; when they already answer for ``title`` no query runs.
+        """
+        try:
+            if hit is None:
+                if not title: return self.frontend_url
+                if query is not None and title.strip().casefold() == query.strip().casefold():
+                    return self.frontend_url
+                hit = await self.catalog.lookup_title(title, {"_id": 0, "tmdb_id": 1})
+            if hit:
+                doc, media_type = hit
+                return self.media_link_for(doc.get("tmdb_id"), media_type)
+        except Exception as e:
+            logger.error(f"Error getting media link: {e}")
+        return self.frontend_url
+
+    # ─────────── resolution ───────────
+    async def _enrich(self, media: ResolvedMedia):
+        with _Timer(media.timings, "tmdb_details"):
+            details = await self.get_tmdb_details(media.tmdb_id, media.media_type)
+        media.trailer   = get_trailer(details)
+        media.platforms = get_platforms(details, self.region)
+        return details
+
+    async def resolve(self, query: str) -> ResolvedMedia | None:
+        """Run the catalog → OMDb → TMDb tiers for a free-text title.
+
+        Concurrent calls for the same normalized query share one resolution,
+        and a query that recently resolved to nothing returns ``None`` without
+        touching Mongo, OMDb or TMDb. Only a clean miss from every tier is
+        remembered; a miss while a tier was failing is retried next time.
+        """
+        key = normalize_query(query)
+        if self.negative.get(key): return None
+        try:
+            media = await self.inflight.run(key, lambda: self._resolve(query))
+        except UpstreamUnavailable as e:
+            logger.warning(f"Unresolved {query!r} with an upstream down, not caching the miss: {e}")
+            return None
+        if media is None:
+            self.negative.set(key, True)
+        return media
+
+    async def _resolve(self, query: str) -> ResolvedMedia | None:
+        timings: dict[str, float] = {}
+        started = time.perf_counter()
+
+        with _Timer(timings, "catalog"):
+            hit = await self.catalog.lookup_title(query)
+        if not hit and self.index is not None:
+            # Typos: a close enough catalog title beats an OMDb/TMDb round-trip
+            with _Timer(timings, "index"):
+                match = self.index.best(query)
+                if match:
+                    hit = await self.catalog.lookup_title(match.title)
+            if hit:
+                logger.info(f"Corrected {query!r} to {match.title!r} (score {match.score})")
+        if hit:
+            doc, media_type = hit
+            media = ResolvedMedia(doc, media_type, doc.get("tmdb_id"), source="catalog", timings=timings)
+            await self._enrich(media)
+            media.poster = doc.get("backdrop") or doc.get("poster")
+        else:
+            outage = None
+            with _Timer(timings, "omdb"):
+                try:
+                    omdb = await self.get_omdb(query, strict=True)
+                except UpstreamUnavailable as e:
+                    outage, omdb = e, {"Response": "False"}
+            if omdb.get("Response") == "True":
+                media = ResolvedMedia(omdb, source="omdb", timings=timings)
+                media.poster = omdb.get("Poster") if omdb.get("Poster") != "N/A" else None
+            else:
+                with _Timer(timings, "tmdb_search"):
+                    found = await self.search_tmdb(query, strict=True)
+                if not found:
+                    if outage: raise outage
+                    logger.info(f"Unresolved {query!r} in {timings}")
+                    return None
+                media_type, first = found
+                media = ResolvedMedia(first, media_type, first["id"], source="tmdb", timings=timings)
+                details = await self._enrich(media)
+                media.info = details or first
+                backdrop = media.info.get("backdrop_path")
+                media.poster = f"{TMDB_IMAGE_BASE}/w780{backdrop}" if backdrop else None
+
+        with _Timer(timings, "link"):
+            media.link = await self.get_media_link(media.title, hit, query)
+        if media.link == self.frontend_url and media.tmdb_id:
+            media.link = self.media_link_for(media.tmdb_id, media.media_type)
+        timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"Resolved {query!r} via {media.source} in {timings}")
+        return media
+
+    async def resolve_doc(self, doc: dict) -> ResolvedMedia:
+        """Enrich a hero-section document that already names its title"""
+        timings: dict[str, float] = {}
+        media = ResolvedMedia(
+            doc, doc.get("media_type", "movie"), doc.get("tmdb_id"), source="hero", timings=timings
+        )
+        details = await self._enrich(media) if media.tmdb_id else None
+
+        # Backdrop from the document is preferred, then its poster, then TMDb
+        media.poster = doc.get("backdrop") or doc.get("poster")
+        if not media.poster and details:
+            path = details.get("backdrop_path") or details.get("poster_path")
+            if path:
+                media.poster = f"{TMDB_IMAGE_BASE}/original{path}"
+        media.link = self.media_link_for(media.tmdb_id, media.media_type)
+        return media
@@ -0,0 +1,186 @@
+import sys
+import time
+import logging
+import unicodedata
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from itertools import chain
+from typing import Any, Hashable, Iterable
+
+logger = logging.getLogger(__name__)
+
+# ──────────────────── CONFIG ────────────────────
+# Fields holding a title's other names; each may be a string or a list of strings
+ALT_TITLE_FIELDS  = ("original_title", "original_name", "alternative_titles", "alt_titles")
+INDEX_MIN_SCORE   = 0.35   # Dice similarity below this is not worth returning
+INDEX_MATCH_SCORE = 0.6    # confident enough to resolve without asking upstream
+
+MEDIA_CODES = {"movie": 0, "tv": 1}
+MEDIA_NAMES = ("movie", "tv")
+
+
+def normalize_title(text: str) -> str:
+    """Casefolded, accent-free, punctuation-free, single-spaced"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c if c.isalnum() else " " for c in text if not unicodedata.combining(c))
+    return " ".join(text.casefold().split())
+
+
+def trigrams(key: str) -> set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _names(doc: dict) -> list[str]:
+    names = [doc.get("title") or doc.get("name") or ""]
+    for f in ALT_TITLE_FIELDS:
+        value = doc.get(f)
+        if isinstance(value, str):
+            names.append(value)
+        elif isinstance(value, list):
+            names += [v if isinstance(v, str) else (v or {}).get("title", "") for v in value]
+    return [n for n in names if n]
+
+
+@dataclass
+class TitleMatch:
+    title: str          # canonical catalog title
+    media_type: str
+    score: float        # Dice similarity of trigram sets, 0..1
+    matched: str        # the title or alternate title that matched
+
+
+class TitleIndex:
+    """In-memory trigram index over catalog titles and their alternate titles.
+
+    Every name is an entry; postings map a trigram to an ``array`` of entry ids
+    and strings are interned, so the index stays a few bytes per trigram.
+    Removals only tombstone entries; ``compact()`` rebuilds once a third of
+    the entries are dead. Ranking is the Dice coefficient of trigram sets,
+    best entry per document.
+    """
+
+    def __init__(self, min_score: float = INDEX_MIN_SCORE):
+        self.min_score = min_score
+        self._reset()
+        self.searches = 0
+        self.build_ms = 0.0
+
+    def _reset(self):
+        self._postings: dict[str, array] = {}
+        self._names: list[str] = []             # entry → name as written
+        self._doc_of: array = array("I")        # entry → document slot
+        self._gram_count: array = array("H")    # entry → number of trigrams
+        self._alive = bytearray()               # entry → 1 live / 0 removed
+        self._doc_keys: list[Hashable] = []     # slot → (media_type, doc id)
+        self._doc_titles: list[str] = []        # slot → canonical title
+        self._doc_media = bytearray()           # slot → MEDIA_CODES value
+        self._slots: dict[Hashable, int] = {}   # (media_type, doc id) → slot
+        self._entries_of: dict[int, list[int]] = {}
+        self._doc_names: dict[int, list[str]] = {}   # slot → names as given, title first
+        self._dead = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, key: tuple[str, Any]) -> bool:
+        media_type, doc_id = key
+        return (media_type, str(doc_id)) in self._slots
+
+    # ─────────── mutation ───────────
+    def add(self, doc: dict, media_type: str, doc_id: Any = None):
+        """Index ``doc`` (replacing any previous version with the same id)"""
+        names = [sys.intern(n) for n in _names(doc)]
+        key = (media_type, str(doc_id if doc_id is not None else doc.get("_id", names[0] if names else "")))
+        self.remove(*key)
+        indexable: dict[str, str] = {}
+        for name in names:
+            norm = normalize_title(name)
+            if norm and norm not in indexable:
+                indexable[norm] = name
+        if not indexable: return   # nothing searchable (e.g. punctuation-only title)
+        slot = len(self._doc_keys)
+        self._doc_keys.append(key)
+        self._doc_titles.append(names[0])
+        self._doc_media.append(MEDIA_CODES.get(media_type, 0))
+        self._slots[key] = slot
+        self._doc_names[slot] = names
+        entries = self._entries_of[slot] = []
+        for norm, name in indexable.items():
+            entry = len(self._names)
+            grams = trigrams(norm)
+            self._names.append(name)
+            self._doc_of.append(slot)
+            self._gram_count.append(min(len(grams), 0xFFFF))
+            self._alive.append(1)
+            entries.append(entry)
+            for g in grams:
+                posting = self._postings.get(g)
+                if posting is None:
+                    posting = self._postings[sys.intern(g)] = array("I")
+                posting.append(entry)
+
+    def remove(self, media_type: str, doc_id: Any):
+        slot = self._slots.pop((media_type, str(doc_id)), None)
+        if slot is None: return
+        self._doc_names.pop(slot, None)
+        for entry in self._entries_of.pop(slot, []):
+            self._alive[entry] = 0
+            self._dead += 1
+        if self._dead * 3 > len(self._names):
+            self.compact()
+
+    def compact(self):
+        # Rebuild from the names each doc was added with, so the canonical title stays put
+        live = [(self._doc_keys[slot], names) for slot, names in self._doc_names.items()]
+        self._reset()
+        for (media_type, doc_id), names in live:
+            self.add({"title": names[0], "alt_titles": names[1:]}, media_type, doc_id)
+
+    async def build(self, catalog) -> int:
+        """(Re)load every movie and show title from ``catalog``"""
+        started = time.perf_counter()
+        self._reset()
+        projection = {"_id": 1, "title": 1, "name": 1, **{f: 1 for f in ALT_TITLE_FIELDS}}
+        for media_type in MEDIA_NAMES:
+            async for doc in catalog.collection(media_type).find({}, projection):
+                self.add(doc, media_type)
+        self.build_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"Title index: {len(self)} titles, {len(self._postings)} trigrams in {self.build_ms} ms")
+        return len(self)
+
+    # ─────────── lookup ───────────
+    def search(self, query: str, limit: int = 5) -> list[TitleMatch]:
+        self.searches += 1
+        norm = normalize_title(query)
+        if not norm: return []
+        grams = trigrams(norm)
+        postings: Iterable[array] = (self._postings[g] for g in grams if g in self._postings)
+        shared = Counter(chain.from_iterable(postings))
+        best: dict[int, tuple[float, int]] = {}
+        for entry, n in shared.items():
+            if not self._alive[entry]: continue
+            score = 2 * n / (len(grams) + self._gram_count[entry])
+            if score < self.min_score: continue
+            slot = self._doc_of[entry]
+            if score > best.get(slot, (0.0, 0))[0]:
+                best[slot] = (score, entry)
+        ranked = sorted(best.items(), key=lambda kv: (-kv[1][0], self._doc_media[kv[0]]))[:limit]
+        return [
+            TitleMatch(self._doc_titles[slot], MEDIA_NAMES[self._doc_media[slot]], round(score, 3), self._names[entry])
+            for slot, (score, entry) in ranked
+        ]
+
+    def best(self, query: str, min_score: float = INDEX_MATCH_SCORE) -> TitleMatch | None:
+        matches = self.search(query, limit=1)
+        return matches[0] if matches and matches[0].score >= min_score else None
+
+    def stats(self) -> dict:
+        return {
+            "titles":   len(self),
+            "entries":  len(self._names) - self._dead,
+            "trigrams": len(self._postings),
+            "searches": self.searches,
+            "build_ms": self.build_ms,
+        }
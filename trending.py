@@ -0,0 +1,106 @@
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+
+from resolver import MediaResolver
+
+logger = logging.getLogger(__name__)
+
+# ──────────────────── CONFIG ────────────────────
+TRENDING_REFRESH_SECONDS = 30 * 60
+TRENDING_RETRY_SECONDS   = 60
+TRENDING_TOP_N           = 5
+
+MEDIA_TYPES = ("movie", "tv")
+WINDOWS     = ("day", "week")
+
+_HEADINGS = {
+    ("movie", "day"):  "🔥 Trending Movies Today",
+    ("movie", "week"): "🔥 Trending Movies This Week",
+    ("tv", "day"):     "📺 Trending Series Today",
+    ("tv", "week"):    "📺 Trending Series This Week",
+}
+
+
+@dataclass
+class TrendingList:
+    media_type: str
+    window: str
+    items: list[dict] = field(default_factory=list)
+    text: str = ""
+    refreshed_at: float = 0.0
+
+
+def render_trending(media_type: str, window: str, items: list[dict]) -> str:
+    text = f"<b>{_HEADINGS[(media_type, window)]}:</b>\n\n"
+    for i, m in enumerate(items, 1):
+        title = m.get("title") or m.get("name") or "-"
+        date  = m.get("release_date") or m.get("first_air_date") or ""
+        text += f"<b>{i}.</b> {title} ({date[:4]})\n"
+    return text
+
+
+class TrendingService:
+    """TMDb trending lists kept warm in memory with their HTML already rendered.
+
+    A background task refreshes every (media type, window) variant on a fixed
+    interval; handlers only read ``text()``. A failed refresh keeps serving the
+    previous list and retries sooner.
+    """
+
+    def __init__(self, resolver: MediaResolver, refresh: float = TRENDING_REFRESH_SECONDS, top_n: int = TRENDING_TOP_N):
+        self.resolver = resolver
+        self.refresh  = refresh
+        self.top_n    = top_n
+        self.lists: dict[tuple[str, str], TrendingList] = {}
+        self._task: asyncio.Task | None = None
+        self.refreshes = self.failures = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None: return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _fetch(self, media_type: str, window: str) -> bool:
+        try:
+            data = await self.resolver.tmdb_get(f"/trending/{media_type}/{window}")
+            items = (data.get("results") or [])[:self.top_n]
+            if not items: raise ValueError("empty result")
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"Trending {media_type}/{window} refresh failed: {e}")
+            return False
+        self.lists[(media_type, window)] = TrendingList(
+            media_type, window, items, render_trending(media_type, window, items), time.time()
+        )
+        self.refreshes += 1
+        return True
+
+    async def refresh_all(self) -> bool:
+        results = await asyncio.gather(*(self._fetch(mt, w) for mt in MEDIA_TYPES for w in WINDOWS))
+        return all(results)
+
+    async def _run(self):
+        while True:
+            ok = await self.refresh_all()
+            await asyncio.sleep(self.refresh if ok else TRENDING_RETRY_SECONDS)
+
+    def get(self, media_type: str = "movie", window: str = "day") -> TrendingList | None:
+        return self.lists.get((media_type, window))
+
+    async def text(self, media_type: str = "movie", window: str = "day") -> str | None:
+        """Rendered list from memory; fetched inline only before the first refresh lands"""
+        if (media_type, window) not in _HEADINGS: return None
+        cached = self.get(media_type, window)
+        if cached is None and await self._fetch(media_type, window):
+            cached = self.get(media_type, window)
+        return cached.text if cached else None
@@ -0,0 +1,257 @@
+import os
+import asyncio
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Awaitable, Callable
+
+from PIL import Image, ImageDraw, ImageFont
+from telegram import Bot, User
+
+logger = logging.getLogger(__name__)
+
+# ──────────────────── CONFIG ────────────────────
+WELCOME_WORKERS   = int(os.getenv("WELCOME_WORKERS", 2))
+AVATAR_CACHE_SIZE = int(os.getenv("AVATAR_CACHE_SIZE", 1024))
+FONT_CANDIDATES   = ("arial.ttf", "times.ttf", "calibri.ttf", "DejaVuSans.ttf")
+
+# Layouts: "card" is the 400x400 circular avatar card, "banner" the 600x300 strip
+LAYOUT_CARD   = "card"
+LAYOUT_BANNER = "banner"
+AVATAR_SIZES  = {LAYOUT_CARD: 300, LAYOUT_BANNER: 100}
+
+# Join bursts: members joining a chat within the window get one welcome
+JOIN_BURST_WINDOW      = float(os.getenv("JOIN_BURST_WINDOW", 5))
+JOIN_FETCH_CONCURRENCY = int(os.getenv("JOIN_FETCH_CONCURRENCY", 4))
+COLLAGE_MAX_AVATARS    = 12
+COLLAGE_COLUMNS        = 4
+COLLAGE_CELL           = 150
+COLLAGE_AVATAR         = 110
+CAPTION_LIMIT          = 1024   # Telegram counts caption length in UTF-16 code units
+
+
+def load_font(size: int) -> ImageFont.ImageFont:
+    for name in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:   # Pillow < 10.1 has no sized default font
+        return ImageFont.load_default()
+
+
+class WelcomeRenderer:
+    """Welcome images for new members, rendered off the event loop.
+
+    Fonts, the circular mask, the backgrounds and the placeholder avatar are
+    built once. Avatars are downloaded once per Telegram ``file_unique_id``,
+    decoded and resized in the worker pool and kept in a small LRU, so a
+    returning or repeated member costs only the profile-photo lookup.
+    """
+
+    def __init__(self, layout: str = LAYOUT_CARD, workers: int = WELCOME_WORKERS, cache_size: int = AVATAR_CACHE_SIZE):
+        self.layout      = layout
+        self.avatar_size = AVATAR_SIZES[layout]
+        self.cache_size  = cache_size
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="welcome")
+        self.font = load_font(24)
+        self.small_font = load_font(16)
+        side = self.avatar_size
+        self.mask = Image.new("L", (side, side), 0)
+        ImageDraw.Draw(self.mask).ellipse((0, 0, side, side), fill=255)
+        # Drawn at collage size, not scaled from the layout's mask
+        self.collage_mask = Image.new("L", (COLLAGE_AVATAR, COLLAGE_AVATAR), 0)
+        ImageDraw.Draw(self.collage_mask).ellipse((0, 0, COLLAGE_AVATAR, COLLAGE_AVATAR), fill=255)
+        self.background = Image.new("RGB", (400, 400) if layout == LAYOUT_CARD else (600, 300), "white")
+        self.placeholder = Image.new("RGBA", (side, side), (128, 128, 128, 255))
+        self._avatars: OrderedDict[str, Image.Image] = OrderedDict()
+        self.avatar_hits = self.avatar_downloads = self.renders = 0
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+
+    def _decode_avatar(self, data: bytes) -> Image.Image:
+        img = Image.open(BytesIO(data))
+        img.draft("RGB", (self.avatar_size, self.avatar_size))
+        return img.convert("RGBA").resize((self.avatar_size, self.avatar_size))
+
+    async def avatar(self, bot: Bot, user: User) -> Image.Image | None:
+        """The member's current profile photo sized for this layout, or ``None``"""
+        try:
+            photos = await bot.get_user_profile_photos(user.id, limit=1)
+            if not photos.total_count: return None
+            sizes = photos.photos[0]
+            # Smallest size that still covers the avatar, else the largest there is
+            photo = next((p for p in sizes if p.width >= self.avatar_size), sizes[-1])
+            cached = self._avatars.get(photo.file_unique_id)
+            if cached is not None:
+                self._avatars.move_to_end(photo.file_unique_id)
+                self.avatar_hits += 1
+                return cached
+            data = await (await bot.get_file(photo.file_id)).download_as_bytearray()
+            img = await self._run(self._decode_avatar, bytes(data))
+            self.avatar_downloads += 1
+        except Exception as e:
+            logger.warning(f"Could not fetch profile photo for {user.id}: {e}")
+            return None
+        self._avatars[photo.file_unique_id] = img
+        while len(self._avatars) > self.cache_size:
+            self._avatars.popitem(last=False)
+        return img
+
+    def _render(self, avatar: Image.Image | None, name: str) -> bytes:
+        img = self.background.copy()
+        draw = ImageDraw.Draw(img)
+        if self.layout == LAYOUT_CARD:
+            img.paste(avatar if avatar is not None else self.placeholder, (50, 50), self.mask)
+            left, _, right, _ = self.font.getbbox(name)
+            draw.text(((400 - (right - left)) // 2, 350), name, fill="black", font=self.font)
+        else:
+            draw.text((20, 20), f"Welcome, {name}!", fill="black", font=self.font)
+            if avatar is not None:
+                img.paste(avatar.convert("RGB"), (20, 100))
+        out = BytesIO()
+        img.save(out, format="PNG" if self.layout == LAYOUT_CARD else "JPEG")
+        return out.getvalue()
+
+    def _render_collage(self, avatars: list[Image.Image | None], names: list[str], extra: int) -> bytes:
+        rows = -(-len(avatars) // COLLAGE_COLUMNS)
+        footer = 40 if extra else 0
+        img = Image.new("RGB", (COLLAGE_COLUMNS * COLLAGE_CELL, rows * COLLAGE_CELL + footer), "white")
+        draw = ImageDraw.Draw(img)
+        side, pad = COLLAGE_AVATAR, (COLLAGE_CELL - COLLAGE_AVATAR) // 2
+        for i, (avatar, name) in enumerate(zip(avatars, names)):
+            x, y = (i % COLLAGE_COLUMNS) * COLLAGE_CELL, (i // COLLAGE_COLUMNS) * COLLAGE_CELL
+            face = (avatar if avatar is not None else self.placeholder).resize((side, side))
+            img.paste(face, (x + pad, y + 8), self.collage_mask)
+            label = name if len(name) <= 14 else name[:13] + "…"
+            left, _, right, _ = self.small_font.getbbox(label)
+            draw.text((x + (COLLAGE_CELL - (right - left)) // 2, y + side + 14), label, fill="black", font=self.small_font)
+        if extra:
+            draw.text((pad, rows * COLLAGE_CELL + 8), f"+ {extra} more", fill="black", font=self.font)
+        out = BytesIO()
+        img.save(out, format="JPEG", quality=85)
+        return out.getvalue()
+
+    async def collage(self, avatars: list[Image.Image | None], names: list[str], extra: int = 0) -> BytesIO:
+        """Grid of circular avatars with names, plus a "+N more" footer"""
+        data = await self._run(self._render_collage, avatars, names, extra)
+        self.renders += 1
+        return BytesIO(data)
+
+    async def compose(self, avatar: Image.Image | None, name: str) -> BytesIO:
+        data = await self._run(self._render, avatar, name)
+        self.renders += 1
+        return BytesIO(data)
+
+    async def render(self, bot: Bot, user: User, name: str | None = None) -> BytesIO:
+        """Fetch the avatar and render the welcome image entirely in memory"""
+        avatar = await self.avatar(bot, user)
+        return await self.compose(avatar, name or user.full_name or "Unknown User")
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+
+def utf16_len(text: str) -> int:
+    # Astral-plane characters (fancy fonts, most emoji) count twice
+    return len(text.encode("utf-16-le")) // 2
+
+
+def format_names(members: list[User], max_units: int = CAPTION_LIMIT) -> str:
+    """Comma-separated member names, then "and N more", within ``max_units`` UTF-16 units"""
+    names, used = [], 0
+    for i, m in enumerate(members):
+        name = m.full_name or "Unknown User"
+        rest = len(members) - i - 1
+        # Leave room for the "and N more" that follows if a later name does not fit
+        tail = utf16_len(f" and {rest} more") if rest else 0
+        size = utf16_len(name) + (2 if names else 0)
+        if used + size + tail > max_units:
+            if not names:
+                return f"{len(members)} new members"
+            return ", ".join(names) + f" and {len(members) - i} more"
+        names.append(name)
+        used += size
+    return ", ".join(names)
+
+
+def burst_caption(template: str, members: list[User]) -> str:
+    """``template`` with ``{names}`` filled in so the caption fits ``CAPTION_LIMIT``"""
+    budget = CAPTION_LIMIT - utf16_len(template.format(names=""))
+    return template.format(names=format_names(members, budget))
+
+
+class JoinAggregator:
+    """Collapses a burst of joins in one chat into a single welcome.
+
+    The first join in a chat opens a ``window``; everyone joining before it
+    closes is welcomed together. A lone member gets ``welcome_one`` as before;
+    a burst gets ``welcome_many`` with a collage of the first
+    ``COLLAGE_MAX_AVATARS`` avatars, fetched at most ``fetch_concurrency`` at a
+    time, so a mass join costs one send instead of one per member.
+    """
+
+    def __init__(
+        self,
+        renderer: WelcomeRenderer,
+        welcome_one: Callable[[Bot, int, User], Awaitable[None]],
+        welcome_many: Callable[[Bot, int, list[User], BytesIO], Awaitable[None]],
+        window: float = JOIN_BURST_WINDOW,
+        fetch_concurrency: int = JOIN_FETCH_CONCURRENCY,
+    ):
+        self.renderer     = renderer
+        self.welcome_one  = welcome_one
+        self.welcome_many = welcome_many
+        self.window       = window
+        self._fetch_slots = asyncio.Semaphore(fetch_concurrency)
+        self._pending: dict[int, list[User]] = {}
+        self._tasks: dict[int, asyncio.Task] = {}    # chat → burst still collecting joins
+        self._running: set[asyncio.Task] = set()     # strong refs until each welcome is sent
+        self.bursts = self.members = 0
+
+    def add(self, bot: Bot, chat_id: int, members: list[User]):
+        if not members: return
+        self._pending.setdefault(chat_id, []).extend(members)
+        if chat_id not in self._tasks:
+            task = self._tasks[chat_id] = asyncio.create_task(self._flush(bot, chat_id))
+            self._running.add(task)
+            task.add_done_callback(lambda t: self._finished(chat_id, t))
+
+    def _finished(self, chat_id: int, task: asyncio.Task):
+        self._running.discard(task)
+        # Cancelled before its window closed: free the chat for the next burst
+        if self._tasks.get(chat_id) is task:
+            del self._tasks[chat_id]
+            self._pending.pop(chat_id, None)
+
+    async def _avatar(self, bot: Bot, user: User) -> Image.Image | None:
+        async with self._fetch_slots:
+            return await self.renderer.avatar(bot, user)
+
+    async def _flush(self, bot: Bot, chat_id: int):
+        await asyncio.sleep(self.window)
+        # Joins from here on open a new burst
+        del self._tasks[chat_id]
+        members = self._pending.pop(chat_id, [])
+        try:
+            seen, unique = set(), []
+            for m in members:
+                if m.id not in seen:
+                    seen.add(m.id)
+                    unique.append(m)
+            self.members += len(unique)
+            if len(unique) == 1:
+                await self.welcome_one(bot, chat_id, unique[0])
+                return
+            self.bursts += 1
+            shown = unique[:COLLAGE_MAX_AVATARS]
+            avatars = await asyncio.gather(*(self._avatar(bot, m) for m in shown))
+            names = [m.full_name or "Unknown User" for m in shown]
+            image = await self.renderer.collage(list(avatars), names, len(unique) - len(shown))
+            await self.welcome_many(bot, chat_id, unique, image)
+        except Exception as e:
+            logger.error(f"Welcome for chat {chat_id} failed: {e}")